@@ -0,0 +1,257 @@
+import numpy as np
+import contextlib
+import platform
+import tracemalloc
+import tempfile
+import argparse
+import shutil
+import json
+import time
+import glob
+import io
+import os
+import scheme_generator as sg
+
+#Benchmark metric units, True if higher value is better
+UNITS = {'files/s': True, 'MB/s': True, 'requests/s': True, 'samples/s': True, 'x': True, 'ms': False, 's': False,
+         'MB': False}
+
+def machine_info():
+    '''Describes machine and library versions, benchmark results depend on'''
+    return {'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': np.__version__}
+
+def best_time(function, repeat=3):
+    '''Returns the shortest of repeat function call times'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def quiet(function, *args, **kwargs):
+    '''Calls function with suppressed print output'''
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+def peak_memory(function):
+    '''Returns peak memory in MB, allocated by function call'''
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak/1e6
+
+def write_ltspice_raw(filename, n_traces=200, n_points=50000, seed=0):
+    '''Writes synthetic LTSpice binary .raw file: UTF-16 header, float64 time and float32 traces'''
+    rng = np.random.default_rng(seed)
+    names = ['time'] + ['V(n{:03d})'.format(k) for k in range(n_traces//2)] + \
+            ['I(R{})'.format(k) for k in range(n_traces - n_traces//2)]
+    header = ['Title: * benchmark', 'Date: {}'.format(time.ctime()), 'Plotname: Transient Analysis',
+              'Flags: real forward', 'No. Variables: {}'.format(len(names)), 'No. Points: {}'.format(n_points),
+              'Offset:   0.0000000000000000e+00', 'Command: Linear Technology Corporation LTspice XVII', 'Variables:']
+    header += ['\t{}\t{}\t{}'.format(k, name, 'time' if k == 0 else 'voltage') for k, name in enumerate(names)]
+    data = np.zeros(n_points, [('time', '<f8'), ('traces', '<f4', (len(names)-1,))])
+    data['time'] = np.linspace(0, 1e-3, n_points)
+    data['traces'] = rng.normal(size=(n_points, len(names)-1))
+    file = open(filename, 'wb')
+    file.write(('\n'.join(header) + '\nBinary:\n').encode('utf-16-le'))
+    file.write(data.tobytes())
+    file.close()
+    return names
+
+def old_raw_reader():
+    '''Returns PyLTSpice .raw reader class (whole file parser), None if PyLTSpice isn't installed'''
+    try:
+        from PyLTSpice.LTSpice_RawRead import LTSpiceRawRead
+        return LTSpiceRawRead
+    except ImportError:
+        pass
+    try:
+        from PyLTSpice import RawRead
+        return RawRead
+    except ImportError:
+        return None
+
+def bench_raw(n_traces=200, n_points=50000, n_outputs=3, n_derated=30, repeat=3):
+    '''Final values and whole traces reading time and peak memory of memory mapped .raw reader,
+    compared with PyLTSpice reader if it is installed'''
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, 'bench.raw')
+    names = write_ltspice_raw(filename, n_traces, n_points)
+    outputs, derated = names[1:1+n_outputs], names[-n_derated:]
+    final = lambda: [x[-1] for x in sg.read_raw(filename, outputs, tail=1).values()]
+    whole = lambda: sg.read_raw(filename, derated)
+    results = {'raw_file_size': (os.path.getsize(filename)/1e6, 'MB'),
+               'raw_final_value': (best_time(final, repeat)*1e3, 'ms'),
+               'raw_final_value_memory': (peak_memory(final), 'MB'),
+               'raw_whole_traces': (best_time(whole, repeat)*1e3, 'ms'),
+               'raw_whole_traces_memory': (peak_memory(whole), 'MB')}
+    reader = old_raw_reader()
+    if reader:
+        def old_final():
+            raw = quiet(reader, filename)
+            return [raw.get_trace(x).get_wave(0)[-1] for x in outputs]
+        def old_whole():
+            raw = quiet(reader, filename)
+            return {x: np.array(raw.get_trace(x).get_wave(0)) for x in derated}
+        old_final_time = best_time(old_final, repeat)
+        old_whole_time = best_time(old_whole, repeat)
+        results.update({'raw_old_final_value': (old_final_time*1e3, 'ms'),
+                        'raw_old_final_value_memory': (peak_memory(old_final), 'MB'),
+                        'raw_old_whole_traces': (old_whole_time*1e3, 'ms'),
+                        'raw_final_value_speedup': (old_final_time/(results['raw_final_value'][0]/1e3), 'x'),
+                        'raw_whole_traces_speedup': (old_whole_time/(results['raw_whole_traces'][0]/1e3), 'x')})
+    shutil.rmtree(directory)
+    return results
+
+def bench_asc(dataset='pcb_dataset', repeat=3):
+    '''Parse and write throughput of all .asc files in dataset'''
+    files = sorted(glob.glob(os.path.join(dataset, '*.asc')))
+    size = sum(os.path.getsize(x) for x in files)/1e6
+    schematics = []
+    parse_time = best_time(lambda: schematics.__setitem__(slice(None), [sg.Schematic(x) for x in files]), repeat)
+    directory = tempfile.mkdtemp()
+    def write():
+        for k, schematic in enumerate(schematics):
+            schematic.write(os.path.join(directory, '{}.asc'.format(k)))
+    write_time = best_time(write, repeat)
+    shutil.rmtree(directory)
+    nets_time = best_time(lambda: [x.nets() for x in schematics], 1)
+    return {'asc_parse': (len(files)/parse_time, 'files/s'),
+            'asc_parse_bytes': (size/parse_time, 'MB/s'),
+            'asc_write': (len(files)/write_time, 'files/s'),
+            'asc_nets': (len(files)/nets_time, 'files/s')}
+
+def synthetic_requests(n=200, seed=0):
+    '''Creates corpus of single and dual output, DC and AC requests'''
+    rng = np.random.default_rng(seed)
+    kinds = ['step down converter', 'low noise linear regulator', 'boost converter', 'buck-boost controller',
+             'synchronous step-down controller', 'flyback converter', 'LED driver', 'capacitor charger']
+    requests = []
+    for k in range(n):
+        kind = kinds[rng.integers(len(kinds))]
+        vin = round(float(rng.uniform(3, 60)), 1)
+        v1, v2 = sorted(round(float(x), 1) for x in rng.uniform(0.8, 48, 2))
+        form = k % 4
+        if form == 0:
+            requests.append('{} input {}V, output {}V'.format(kind, vin, v1))
+        elif form == 1:
+            requests.append('{} {}V to {}V'.format(kind, vin, v1))
+        elif form == 2:
+            requests.append('{} input {}V, output {}V and {}V'.format(kind, vin, v1, v2))
+        else:
+            requests.append('{} {}V {}Hz AC input, output {}V'.format(kind, round(vin/1.41, 1),
+                                                                   [50, 60][k % 2], v1))
+    return requests
+
+def bench_matching(database_file='Power_supply_data.csv', n=200):
+    '''Catalog matching latency percentiles and throughput over synthetic requests'''
+    start = time.perf_counter()
+    index = sg.SchemeIndex(database_file)
+    load_time = time.perf_counter() - start
+    latencies = []
+    for request in synthetic_requests(n):
+        start = time.perf_counter()
+        quiet(sg.get_best_scheme_match, request, database_file, index)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies)
+    p50, p99 = np.percentile(latencies, [50, 99])*1e3
+    return {'match_index_load': (load_time*1e3, 'ms'),
+            'match_latency_p50': (p50, 'ms'),
+            'match_latency_p99': (p99, 'ms'),
+            'match_throughput': (len(latencies)/latencies.sum(), 'requests/s')}
+
+def bench_ga(sizes=(20, 200, 2000), n_components=20, repeat=5, seed=0):
+    '''Mutation, crossover and nominal raw rounding throughput at different population sizes'''
+    rng = np.random.default_rng(seed)
+    codes = np.arange(n_components) % len(sg.TYPE_CODES)
+    results = {}
+    for size in sizes:
+        values = sg.snap_population(10**rng.uniform(-9, 5, (size, n_components)), codes)
+        other = values[::-1].copy()
+        mutation_time = best_time(lambda: sg.mutation(values, codes, 0.1, rng), repeat)
+        crossover_time = best_time(lambda: sg.crossover(values, other, rng), repeat)
+        snap_time = best_time(lambda: sg.snap_population(values, codes), repeat)
+        results['ga_mutation_pop{}'.format(size)] = (size/mutation_time, 'samples/s')
+        results['ga_crossover_pop{}'.format(size)] = (size/crossover_time, 'samples/s')
+        results['ga_snap_pop{}'.format(size)] = (size/snap_time, 'samples/s')
+    return results
+
+def bench_end_to_end(request=sg.text1, n_generations=6, n_samples=20, jobs=4, seed=0):
+    '''Whole optimization time with stand-in simulator and fixed seed, achieved fitness is
+    stored to check that optimization result is reproducible'''
+    simulator = sg.StandInSimulator(jobs)
+    index = sg.SchemeIndex()
+    start = time.perf_counter()
+    result = quiet(sg.generate_scheme_by_request, request, n_generations, n_samples, cache=sg.FitnessCache(),
+                   simulator=simulator, index=index, seed=seed, job_name='bench_')
+    duration = time.perf_counter() - start
+    for file in glob.glob('bench_*'):
+        os.remove(file)
+    return {'e2e_time': (duration, 's'), 'e2e_fitness': (result['fitness'], 'V')}
+
+SUITES = {'asc': bench_asc, 'raw': bench_raw, 'matching': bench_matching, 'ga': bench_ga, 'e2e': bench_end_to_end}
+
+def compare(results, baseline, thresholds, default_threshold=0.1):
+    '''Compares results with baseline results. Metric regresses if it is worse than baseline
+    by more than its threshold (relative). Metrics without known direction must be equal.
+    Returns list of regression descriptions'''
+    regressions = []
+    print('{:<28}{:>14}{:>14}{:>10}'.format('Metric', 'Baseline', 'Current', 'Change'))
+    for name, (value, unit) in results.items():
+        if not name in baseline:
+            continue
+        old = baseline[name][0]
+        change = (value - old)/abs(old) if old else 0
+        print('{:<28}{:>14.4g}{:>14.4g}{:>+10.1%}  {}'.format(name, old, value, change, unit))
+        threshold = thresholds.get(name, default_threshold)
+        if not unit in UNITS:
+            if abs(value - old) > 1e-9*max(abs(old), 1):
+                regressions.append('{} changed from {:.6g} to {:.6g}'.format(name, old, value))
+        elif (-change if UNITS[unit] else change) > threshold:
+            regressions.append('{} is {:.1%} worse than baseline (threshold {:.0%})'.format(name, abs(change),
+                                                                                           threshold))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='scheme_generator benchmarks')
+    parser.add_argument('--suite', dest='suite', type=str, nargs='+', default=list(SUITES.keys()),
+                        choices=list(SUITES.keys()), help='Benchmark suites to run')
+    parser.add_argument('--output', dest='output', type=str, default='benchmark_results.json',
+                        help='.json file for results')
+    parser.add_argument('--baseline', dest='baseline', type=str, default=None,
+                        help='.json file with baseline results for comparison')
+    parser.add_argument('--threshold', dest='threshold', type=float, default=0.1,
+                        help='Relative regression threshold for all metrics')
+    parser.add_argument('--metric-threshold', dest='metric_threshold', type=str, nargs='*', default=[],
+                        help='Regression thresholds of specific metrics as name=value')
+    args = parser.parse_args()
+    results = {}
+    for name in args.suite:
+        print('Running {} benchmark'.format(name))
+        results.update(SUITES[name]())
+    for name, (value, unit) in results.items():
+        print('{:<28}{:>14.4g}  {}'.format(name, value, unit))
+    file = open(args.output, 'w')
+    json.dump({'machine': machine_info(), 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'results': results}, file, indent=2)
+    file.close()
+    print('Results: {}'.format(args.output))
+    if args.baseline:
+        file = open(args.baseline, 'r')
+        baseline = json.load(file)
+        file.close()
+        if baseline['machine'] != machine_info():
+            print('Baseline was measured on different machine: {}'.format(baseline['machine']))
+        thresholds = {x.split('=')[0]: float(x.split('=')[1]) for x in args.metric_threshold}
+        regressions = compare(results, baseline['results'], thresholds, args.threshold)
+        for regression in regressions:
+            print('REGRESSION: {}'.format(regression))
+        if regressions:
+            raise SystemExit(1)
+        print('No regressions')
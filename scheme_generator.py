@@ -1,12 +1,25 @@
-from PyLTSpice.LTSpiceBatch import SimCommander
-from PyLTSpice.LTSpice_RawRead import LTSpiceRawRead
-import random
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import pandas as pd
-from fuzzywuzzy import fuzz
+from collections import OrderedDict
+import threading
+import queue
+import getpass
+import socket
+import sys
+import time
+import hashlib
+import sqlite3
+import json
 import re
 import os
 import argparse
+import subprocess
+import asyncio
+import functools
+import contextlib
+import tempfile
+import shutil
+import abc
 
 #Some common nominal raw series for electronic components
 E6_RAW  = np.array([100, 150, 220, 330, 470, 680])
@@ -30,6 +43,12 @@ RAW_SERIES = {'ind':  E24_RAW,
               'cap':  E12_RAW,
               'res':  E48_RAW }
 
+#Component type codes, used in population matrix
+TYPE_CODES = {name: code for code, name in enumerate(RAW_SERIES.keys())}
+
+# LTSpice .asc files are written in single byte encoding (µ is 0xB5)
+ASC_ENCODING = 'latin-1'
+
 # Common resistor power nominal raw
 R_POWER_RAW = np.array([0.125, 0.25, 0.5, 1.0, 2.0, 5.0,
                         10.0, 25.0, 50.0, 100.0])
@@ -38,19 +57,106 @@ R_POWER_RAW = np.array([0.125, 0.25, 0.5, 1.0, 2.0, 5.0,
 C_VOLTAGE_RAW = np.array([10, 16, 20, 25, 35, 50, 63, 80,
                           100, 160, 200, 250, 350, 400, 450])
 
+class Profiler:
+    '''Collects timed spans of pipeline phases from all threads. Disabled profiler only checks flag.
+    Spans are written as trace event json (chrome://tracing, Perfetto) and summarized by phase'''
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.lock = threading.Lock()
+        self.start = time.time()
+
+    def enable(self):
+        self.enabled = True
+        self.events = []
+        self.start = time.time()
+
+    def add(self, name, start, duration, **args):
+        if self.enabled:
+            with self.lock:
+                self.events.append((name, threading.get_ident(), start, duration, args))
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        '''Times with block, yields args dictionary, that can be updated inside block'''
+        start = time.time()
+        try:
+            yield args
+        finally:
+            self.add(name, start, time.time() - start, **args)
+
+    def timed(self, name):
+        '''Function decorator, timing every call as name span'''
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def phases(self):
+        '''Returns {name: durations array} of collected spans'''
+        durations = {}
+        for name, _, _, duration, _ in self.events:
+            durations.setdefault(name, []).append(duration)
+        return {name: np.array(x) for name, x in durations.items()}
+
+    def write_trace(self, filename):
+        '''Writes collected spans to trace event json file'''
+        events = [{'name': name, 'cat': 'scheme_generator', 'ph': 'X', 'pid': os.getpid(), 'tid': thread,
+                   'ts': round((start-self.start)*1e6), 'dur': round(duration*1e6), 'args': args}
+                  for name, thread, start, duration, args in self.events]
+        file = open(filename, 'w')
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        file.close()
+
+    def summary(self, jobs=1):
+        '''Prints per-phase span count, total time and duration percentiles, evaluations per second,
+        simulation workers utilization and simulator statistics from log files'''
+        wall = max(time.time() - self.start, 1e-6)
+        print('{:<20}{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}'.format('Phase', 'Count', 'Total,s', 'p50,ms',
+                                                                   'p90,ms', 'p99,ms', 'Max,ms'))
+        for name, durations in sorted(self.phases().items(), key=lambda x: -x[1].sum()):
+            p50, p90, p99 = np.percentile(durations, [50, 90, 99])*1e3
+            print('{:<20}{:>8}{:>10.3f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}'.format(
+                  name, len(durations), durations.sum(), p50, p90, p99, durations.max()*1e3))
+        simulations = [(duration, args) for name, _, _, duration, args in self.events if name == 'simulation']
+        evaluations = sum(args.get('samples', 1) for _, args in simulations)
+        print('Evaluations: {} in {:.2f}s, {:.2f} evaluations/s'.format(evaluations, wall, evaluations/wall))
+        print('Worker utilization: {:.0%}'.format(sum(x[0] for x in simulations)/(wall*jobs)))
+        logs = [args for name, _, _, _, args in self.events if name == 'simulator run' and 'elapsed' in args]
+        if logs:
+            print('Simulator reported time: {:.3f}s in {} runs'.format(sum(x['elapsed'] for x in logs), len(logs)))
+        points = [x['timepoints'] for x in logs if 'timepoints' in x]
+        if points:
+            print('Timepoints per run: mean {:.0f}, max {}'.format(np.mean(points), max(points)))
+
+PROFILER = Profiler()
+
 def number_to_nominal(number, series):
     '''Rounds number to nearest upper value in nominal series'''
     max_val = max(series) 
     raw_value = series[(series - number)>0]
     return raw_value[0] if number<max_val else number
 
+def snap_to_raw(values, raw = E48_RAW):
+    '''Rounds first three digits of every array value to nearest (upper or lower) value in series,
+    negative values are taken by absolute value, zeros are replaced with 1'''
+    values = np.abs(np.asarray(values, dtype=float))
+    values[values == 0] = 1.0
+    dec = np.floor(np.log10(values))
+    mantissa = values/10**dec*100
+    upper = np.clip(np.searchsorted(raw, mantissa), 0, len(raw)-1)
+    lower = np.clip(upper-1, 0, len(raw)-1)
+    nearest = np.where(np.abs(mantissa-raw[lower]) <= np.abs(raw[upper]-mantissa), raw[lower], raw[upper])
+    return nearest*10**(dec-2)
+
 def number_to_raw_value(number, raw = E48_RAW):
     '''Rounds first three number digits to nearest (upper or lower) value in series'''
-    exp_number = "{:e}".format(number)
-    value = exp_number.split('e')[0]
-    dec = int(exp_number.split('e')[1])
-    raw_value = raw[np.argmin(abs(raw - float(value)*100))]
-    return float(raw_value*10**(dec-2))
+    return float(snap_to_raw([number], raw)[0])
 
 def number_to_exp(number):
     '''Converts number to exponential abbreviated format like 10K or 47µ'''
@@ -85,165 +191,1398 @@ def exp_to_number(string):
         string = string.replace(key, value)
     return float(string)
 
-def get_capacitor_nodes(filename, capacitor_name):
-    '''Finds node names, connected to capacitor in LTSpice netlist file''' 
-    nodes = None
-    netlist_name = '.'.join(filename.split('.')[0:-1])+'_1.net'
-    netlist_file = open(netlist_name, 'r')
+# Pin coordinates of two-pin LTSpice symbols for R0 orientation
+SYMBOL_PINS = {'res':      ((16, 16), (16, 96)),
+               'ind':      ((16, 16), (16, 96)),
+               'ind2':     ((16, 16), (16, 96)),
+               'cap':      ((16, 0), (16, 64)),
+               'polcap':   ((16, 0), (16, 64)),
+               'diode':    ((16, 0), (16, 64)),
+               'schottky': ((16, 0), (16, 64)),
+               'zener':    ((16, 0), (16, 64)),
+               'led':      ((16, 0), (16, 64)),
+               'voltage':  ((0, 16), (0, 96)),
+               'current':  ((0, 16), (0, 96))}
+
+def transform_pin(pin, orientation):
+    '''Rotates and mirrors symbol pin coordinates by LTSpice orientation like R90 or M180'''
+    x, y = pin
+    if orientation[0] == 'M':
+        x = -x
+    for i in range(int(orientation[1:])//90):
+        x, y = -y, x
+    return x, y
+
+class Symbol:
+    '''Schematic component: symbol type, coordinates, orientation and WINDOW/SYMATTR lines
+    in file order, SYMATTR lines are stored as ['SYMATTR', name, value]'''
+    def __init__(self, symbol_type, x, y, orientation):
+        self.type = symbol_type
+        self.x = x
+        self.y = y
+        self.orientation = orientation
+        self.lines = []
+
+    @property
+    def name(self):
+        return self.get('InstName', '')
+
+    def get(self, attribute, default=None):
+        '''Returns SYMATTR value by attribute name'''
+        for line in self.lines:
+            if line[0] == 'SYMATTR' and line[1] == attribute:
+                return line[2]
+        return default
+
+    def set(self, attribute, value):
+        '''Changes SYMATTR value or appends new attribute'''
+        for line in self.lines:
+            if line[0] == 'SYMATTR' and line[1] == attribute:
+                line[2] = value
+                return
+        self.lines.append(['SYMATTR', attribute, value])
+
+    def remove(self, prefix):
+        '''Removes all attributes with names starting with prefix'''
+        self.lines = [x for x in self.lines if not (x[0] == 'SYMATTR' and x[1].startswith(prefix))]
+
+    def pins(self):
+        '''Returns absolute pin coordinates for two-pin symbols or empty list'''
+        pins = SYMBOL_PINS.get(self.type.lower(), ())
+        return [(self.x+dx, self.y+dy) for dx, dy in (transform_pin(pin, self.orientation) for pin in pins)]
+
+    def text(self):
+        lines = ['SYMBOL {} {} {} {}\n'.format(self.type, self.x, self.y, self.orientation)]
+        for line in self.lines:
+            lines.append(' '.join(x for x in line if x != '')+'\n')
+        return lines
+
+class Schematic:
+    '''LTSpice .asc file, parsed once to list of records in file order: Symbol objects,
+    ['WIRE', x1, y1, x2, y2], ['FLAG', x, y, name] and other lines as strings.
+    Symbols are indexed by InstName in components dictionary'''
+    @PROFILER.timed('schematic parse')
+    def __init__(self, filename=None, lines=()):
+        self.items = []
+        self.components = {}
+        if filename:
+            file = open(filename, 'r', encoding=ASC_ENCODING)
+            lines = file.readlines()
+            file.close()
+        symbol = None
+        for line in lines:
+            line = line.rstrip('\r\n')
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == 'WIRE':
+                self.items.append(['WIRE'] + [int(x) for x in words[1:5]])
+            elif words[0] == 'FLAG':
+                self.items.append(['FLAG', int(words[1]), int(words[2]), words[3]])
+            elif words[0] == 'SYMBOL':
+                symbol = Symbol(words[1], int(words[2]), int(words[3]), words[4])
+                self.items.append(symbol)
+            elif words[0] == 'SYMATTR' and symbol:
+                parts = line.split(' ', 2)
+                symbol.lines.append(['SYMATTR', parts[1], parts[2] if len(parts) > 2 else ''])
+            elif words[0] == 'WINDOW' and symbol:
+                symbol.lines.append(['WINDOW', line.split(' ', 1)[1]])
+            else:
+                symbol = None
+                self.items.append(line)
+        self.reindex()
+
+    def reindex(self):
+        '''Updates components dictionary'''
+        self.components = {x.name: x for x in self.symbols() if x.name}
+
+    def symbols(self):
+        return [x for x in self.items if isinstance(x, Symbol)]
+
+    def wires(self):
+        return [x for x in self.items if isinstance(x, list) and x[0] == 'WIRE']
+
+    def flags(self):
+        return [x for x in self.items if isinstance(x, list) and x[0] == 'FLAG']
+
+    def copy(self):
+        return Schematic(lines=self.text())
+
+    def text(self):
+        '''Returns .asc file lines'''
+        lines = []
+        for item in self.items:
+            if isinstance(item, Symbol):
+                lines.extend(item.text())
+            elif isinstance(item, list):
+                lines.append(' '.join(str(x) for x in item)+'\n')
+            else:
+                lines.append(item+'\n')
+        return lines
+
+    @PROFILER.timed('schematic write')
+    def write(self, filename):
+        file = open(filename, 'w', encoding=ASC_ENCODING)
+        file.writelines(self.text())
+        file.close()
+
+    def frame(self):
+        '''Finds min and max component and wire coordinates'''
+        xs = [x.x for x in self.symbols()] + [c for w in self.wires() for c in (w[1], w[3])]
+        ys = [x.y for x in self.symbols()] + [c for w in self.wires() for c in (w[2], w[4])]
+        return min(xs+[10000]), min(ys+[10000]), max(xs+[-10000]), max(ys+[-10000])
+
+    def delete(self, names_types):
+        '''Deletes components by list of (InstName, symbol type) tuples'''
+        self.items = [x for x in self.items
+                      if not (isinstance(x, Symbol) and (x.name, x.type) in names_types)]
+        self.reindex()
+
+    def nets(self):
+        '''Connects pins of two-pin symbols by wires and flags,
+        returns {component name: list of pin net names}, unnamed nets are named N001, N002...'''
+        wires, flags = self.wires(), self.flags()
+        pins = {x.name: x.pins() for x in self.symbols() if x.name and x.pins()}
+        points = set(p for w in wires for p in ((w[1], w[2]), (w[3], w[4])))
+        points.update((f[1], f[2]) for f in flags)
+        points.update(p for pair in pins.values() for p in pair)
+        parent = {p: p for p in points}
+        def root(p):
+            while parent[p] != p:
+                parent[p] = parent[parent[p]]
+                p = parent[p]
+            return p
+        for _, x1, y1, x2, y2 in wires:
+            for (x, y) in points:
+                collinear = (x2-x1)*(y-y1) == (y2-y1)*(x-x1)
+                if collinear and min(x1, x2) <= x <= max(x1, x2) and min(y1, y2) <= y <= max(y1, y2):
+                    parent[root((x, y))] = root((x1, y1))
+        net_names = {}
+        for f in flags:
+            net_names.setdefault(root((f[1], f[2])), f[3])
+        nets = {}
+        for name, pair in pins.items():
+            for p in pair:
+                if not root(p) in net_names:
+                    net_names[root(p)] = 'N{:03d}'.format(len(net_names)+1)
+            nets[name] = [net_names[root(p)] for p in pair]
+        return nets
+
+SCHEMATIC_CACHE = {}
+
+def cached_schematic(filename):
+    '''Returns copy of .asc file Schematic, parsed files are kept in memory until they are changed'''
+    key = (os.path.abspath(filename), os.path.getmtime(filename))
+    if not key in SCHEMATIC_CACHE:
+        SCHEMATIC_CACHE[key] = Schematic(filename)
+    return SCHEMATIC_CACHE[key].copy()
+
+def as_schematic(schematic):
+    '''Returns Schematic for .asc file name or Schematic itself'''
+    return schematic if isinstance(schematic, Schematic) else Schematic(schematic)
+
+def get_netlist_nodes(netlist_name):
+    '''Reads component node names from SPICE netlist file, returns {component name: nodes list}'''
+    netlist_file = open(netlist_name, 'r', encoding=ASC_ENCODING)
     netlist = netlist_file.readlines()
     netlist_file.close()
+    nodes = {}
     for line in netlist:
-        if line.split()[0] == capacitor_name:
-            nodes = (line.split()[1], line.split()[2])
+        line = line.split()
+        if len(line) > 2 and not line[0][0] in '*.+':
+            nodes[line[0]] = line[1:3]
     return nodes
 
+def get_capacitor_nodes(netlist_nodes, capacitor_name):
+    '''Finds node names, connected to capacitor, in dictionary from get_netlist_nodes'''
+    nodes = netlist_nodes.get(capacitor_name)
+    return tuple(nodes) if nodes else None
+
 def get_netlist_components(filename):
-    '''Creates component values and component types dictionaries from .asc file'''
+    '''Creates component values and component types dictionaries from .asc file or Schematic'''
     components_dict = {}
     comp_types_dict = {}
-    last_component_name = None
-    component_type = None
-    netlist_file = open(filename, 'r')
-    for line in netlist_file:
-        line = line.split()
-        if line[0] == 'SYMBOL':
-            component_type = line[1]
-            last_component_name = ''
-        if line[0] == 'SYMATTR' and line[1] == 'InstName':
-            last_component_name = line[2]
-        if (line[0] == 'SYMATTR') and (line[1] == 'Value'):
-            if last_component_name != '' and (component_type in RAW_SERIES.keys()):
-                if not ('Rload' in last_component_name):
-                    components_dict.update({last_component_name: exp_to_number(line[2])})
-                    comp_types_dict.update({last_component_name: component_type})
-                    last_component_name = '' 
-    netlist_file.close()
+    for symbol in as_schematic(filename).symbols():
+        value = symbol.get('Value')
+        if symbol.name and value and symbol.type in RAW_SERIES.keys() and not 'Rload' in symbol.name:
+            components_dict.update({symbol.name: exp_to_number(value.split()[0])})
+            comp_types_dict.update({symbol.name: symbol.type})
     return (components_dict, comp_types_dict)
 
 def write_netlist_components(source_file, destination_file, components):
-    '''Writes component dictionary to LTSpice .asc file, using source file as template'''
-    netlist_file = open(source_file, 'r')
-    netlist = netlist_file.readlines()
-    netlist_file.close()
-    last_component_name = ''
-    for i in range(len(netlist)):
-        line = netlist[i]
-        keywords = line.split()
-        if keywords[0] == 'SYMATTR':
-            if keywords[1]== 'InstName' and keywords[2] in components.keys():
-                last_component_name = keywords[2]
-            if keywords[1]=='Value' and last_component_name!='':
-                new_value = number_to_exp(components[last_component_name])
-                netlist[i] = 'SYMATTR Value '+new_value+'\n'
-                last_component_name = ''
-    file = open(destination_file, 'w+')
-    file.writelines(netlist)
-    file.close()
+    '''Writes component dictionary to LTSpice .asc file, using source file or Schematic as template'''
+    schematic = as_schematic(source_file)
+    if schematic is source_file:
+        schematic = schematic.copy()
+    for name, value in components.items():
+        if name in schematic.components:
+            schematic.components[name].set('Value', number_to_exp(value))
+    schematic.write(destination_file)
     return
 
 def get_voltage_source(file, node_patterns = ['IN', 'VIN']):
-    '''Finds name of voltage source, connected to input node in .asc file'''
-    input_voltage_name, node_name = None, None
-    LTC = SimCommander(file)
-    net_file_name = '.'.join(file.split('.')[0:-1])+'.net'
-    netlist_file = open(net_file_name, 'r')
-    netlist = netlist_file.readlines()
-    netlist_file.close()
-    input_voltage_node_name = ''
-    for line in netlist:
-        line = line.split()
-        if len(line)==4:
-            if line[1] in node_patterns or line[2] in node_patterns:
-                input_voltage_name = line[0]
-                node_name = line[1]
-    return input_voltage_name, node_name
+    '''Finds name of voltage source, connected to input node in .asc file or Schematic'''
+    schematic = as_schematic(file)
+    for name, nodes in schematic.nets().items():
+        if schematic.components[name].type.lower() == 'voltage':
+            for node in nodes:
+                if node in node_patterns:
+                    return name, node
+    return None, None
 
 def write_intital_voltage(sourse_file, destination_file, voltage):
-    '''Writes new input voltage source value to .asc file'''
-    netlist_file = open(sourse_file, 'r')
-    netlist = netlist_file.readlines()
-    netlist_file.close()
-    input_v_name, _ = get_voltage_source(sourse_file)
-    last_component_name = ''
-    for i in range(len(netlist)):
-        line = netlist[i].split()
-        if line[0] == 'SYMATTR' and line[1] == 'InstName' and line[2]==input_v_name:
-            last_component_name = 'IN'    
-        if (line[0] == 'SYMATTR') and (line[1] == 'Value') and (last_component_name == 'IN'):
-            netlist[i] = 'SYMATTR Value '+ str(voltage) +'\n'
-            last_component_name = ''  
-    file = open(destination_file, 'w+')
-    file.writelines(netlist)
-    file.close()
-    return
+    '''Writes new input voltage source value to Schematic (in place) and to .asc file,
+    if destination_file is defined'''
+    schematic = as_schematic(sourse_file)
+    input_v_name, _ = get_voltage_source(schematic)
+    if input_v_name:
+        schematic.components[input_v_name].set('Value', str(voltage))
+    if destination_file:
+        schematic.write(destination_file)
+    return schematic
+
+class Population:
+    '''Circuit samples as (n_samples x n_components) values matrix,
+    component names and type codes are common for all samples'''
+    def __init__(self, names, codes, values):
+        self.names = list(names)
+        self.codes = np.asarray(codes)
+        values = np.asarray(values, dtype=float)
+        n_samples = len(values) if values.ndim > 1 else values.size//max(len(self.names), 1)
+        self.values = values.reshape(n_samples, len(self.names))
+
+    def __len__(self):
+        return len(self.values)
+
+    def sample(self, i):
+        '''Returns sample i as components dictionary'''
+        return dict(zip(self.names, self.values[i].tolist()))
+
+    def samples(self):
+        return [self.sample(i) for i in range(len(self))]
+
+    def subset(self, rows):
+        return Population(self.names, self.codes, self.values[rows])
+
+    def extend(self, values):
+        return Population(self.names, self.codes, np.vstack([self.values, values]))
 
-def mutation(parent, component_types, mutation_rate=0.1):
-    '''Simple mutation function, randimly changes parent value by mutation_rate,
+def snap_population(values, codes):
+    '''Rounds values matrix columns to nominal series raw of component types'''
+    values = np.array(values, dtype=float)
+    for name, code in TYPE_CODES.items():
+        columns = codes == code
+        if columns.any():
+            values[:, columns] = snap_to_raw(values[:, columns], RAW_SERIES[name])
+    return values
+
+@PROFILER.timed('mutation')
+def mutation(values, codes, mutation_rate=0.1, rng=None):
+    '''Simple mutation function, randimly changes values matrix by mutation_rate,
     then rounds result to nominal series raw for specific component'''
-    child = {}
-    for key, value in parent.items():
-        mu = float(value)
-        new_val = random.normalvariate(mu, mu*mutation_rate)
-        raw = RAW_SERIES[component_types[key]]
-        child.update({key: number_to_raw_value(new_val, raw)})
-    return child
-
-def crossover(parent1, parent2):
-    '''Simple crossover function, randimly samples values from two parents'''    
-    child = {}
-    for key, value in parent1.items():
-        new_value = random.choice([parent1[key], parent2[key]])
-        child.update({key: new_value})
-    return child
-
-def generate_population(template, component_types, n=20):
-    '''Generates initial population with n samples by template mutation''' 
-    population = []
-    population.append(template) #first sample is original
-    for i in range(0,n-1):
-        population.append(mutation(template, component_types))
-    return population, component_types
-
-def selection(population, filename, out_node_list=["V(OUT)"], v_out = [5], fraction=0.2):
-    '''Performs selection of samples with the best fitness function values'''
-    LTC = SimCommander(filename)
-    LTC.set_parameters()
-    for sample in population:
-        for key, value in sample.items():
-            LTC.set_component_value(key, value)   
-        LTC.run() 
-        LTC.wait_completion()
-    fitness_scores = []
+    rng = rng or np.random.default_rng()
+    values = np.asarray(values, dtype=float)
+    new_values = values + values*mutation_rate*rng.standard_normal(values.shape)
+    return snap_population(new_values, codes)
+
+@PROFILER.timed('crossover')
+def crossover(parents1, parents2, rng=None):
+    '''Simple uniform crossover function, randimly samples values from two parents matrices'''
+    rng = rng or np.random.default_rng()
+    return np.where(rng.random(np.shape(parents1)) < 0.5, parents1, parents2)
+
+def generate_population(template, component_types, n=20, rng=None, seeds=()):
+    '''Generates initial population with n samples by template mutation. If seeds list of
+    component dictionaries is defined, seeds and their mutations replace half of samples,
+    components missing in seed keep template values'''
+    names = list(template.keys())
+    codes = np.array([TYPE_CODES[component_types[x]] for x in names], dtype=int)
+    values = np.tile(np.array([template[x] for x in names], dtype=float), (n, 1))
+    values[1:] = mutation(values[1:], codes, rng=rng) #first sample is original
+    if len(seeds):
+        seeds = np.array([[seed.get(x, template[x]) for x in names] for seed in seeds], dtype=float)
+        n_seeded = max(len(seeds), (n-1)//2)
+        seeded = seeds[np.arange(n_seeded) % len(seeds)]
+        seeded[len(seeds):] = mutation(seeded[len(seeds):], codes, rng=rng)
+        values[1:1+n_seeded] = seeded[:n-1]
+    return Population(names, codes, values)
+
+def file_hash(filename):
+    '''Calculates sha1 hash of file content'''
+    file = open(filename, 'rb')
+    digest = hashlib.sha1(file.read()).hexdigest()
+    file.close()
+    return digest
+
+class FitnessCache:
+    '''Cache of simulated output voltages, keyed by circuit context and component values.
+    Keeps recently used results in memory (LRU), all results are also kept in SQLite
+    database file if db_file is defined'''
+    def __init__(self, db_file=None, max_size=10000):
+        self.max_size = max_size
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if db_file:
+            self.db = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+            self.db.execute('PRAGMA journal_mode=WAL')  #concurrent readers and writer of island workers
+            self.db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, outputs TEXT)')
+            self.db.commit()
+
+    @staticmethod
+    def key(context, names, values):
+        '''Creates content-addressed key from context tuple (model hash, input voltage,
+        AC source, output nodes) and canonical component values tuple'''
+        components = tuple((name, '{:.6e}'.format(value)) for name, value in sorted(zip(names, values)))
+        text = json.dumps([list(map(str, context)), components])
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def get(self, key):
+        '''Returns cached output voltages list or None'''
+        with self.lock:
+            outputs = self.memory.get(key)
+            if outputs is not None:
+                self.memory.move_to_end(key)
+            elif self.db:
+                row = self.db.execute('SELECT outputs FROM results WHERE key=?', (key,)).fetchone()
+                if row:
+                    outputs = json.loads(row[0])
+                    self._remember(key, outputs)
+            if outputs is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return outputs
+
+    def put(self, key, outputs):
+        '''Stores simulated output voltages list'''
+        outputs = [float(x) for x in outputs]
+        with self.lock:
+            self._remember(key, outputs)
+            if self.db:
+                self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?)', (key, json.dumps(outputs)))
+                self.db.commit()
+
+    def _remember(self, key, outputs):
+        self.memory[key] = outputs
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def report(self):
+        '''Prints cache hit and miss counts'''
+        total = self.hits + self.misses
+        rate = self.hits/total if total else 0
+        print('Cache hits: {}, misses: {} ({:.0%} hit rate)'.format(self.hits, self.misses, rate))
+
+class DesignLibrary:
+    '''Library of optimized designs in SQLite database file (in memory if db_file is None).
+    Design is dictionary with model (circuit file hash), simulator, chip, input_voltage,
+    ac (AC source tuple), targets and achieved output voltages, components dictionary,
+    fitness, circuit (generated .asc file text) and budget (number of generations by population size)'''
+    FIELDS = ['model', 'simulator', 'chip', 'input_voltage', 'ac', 'targets', 'components', 'achieved',
+              'fitness', 'circuit', 'budget']
+    JSON_FIELDS = ['ac', 'targets', 'components', 'achieved']
+
+    def __init__(self, db_file=None):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_file or ':memory:', timeout=30, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS designs (id INTEGER PRIMARY KEY, {})'.format(
+                        ', '.join(self.FIELDS)))
+        self.db.execute('CREATE INDEX IF NOT EXISTS designs_model ON designs (model, simulator)')
+        columns = [x[1] for x in self.db.execute('PRAGMA table_info(designs)')]
+        for field in self.FIELDS:
+            if field not in columns:  #library of previous version
+                self.db.execute('ALTER TABLE designs ADD COLUMN {}'.format(field))
+        self.db.commit()
+
+    def store(self, design):
+        row = [json.dumps(design[x]) if x in self.JSON_FIELDS else design[x] for x in self.FIELDS]
+        with self.lock:
+            self.db.execute('INSERT INTO designs ({}) VALUES ({})'.format(', '.join(self.FIELDS),
+                            ', '.join('?'*len(self.FIELDS))), row)
+            self.db.commit()
+
+    def designs(self, model, simulator):
+        '''Returns all designs of circuit, simulated by simulator'''
+        with self.lock:
+            rows = self.db.execute('SELECT {} FROM designs WHERE model=? AND simulator=?'.format(
+                                   ', '.join(self.FIELDS)), (model, simulator)).fetchall()
+        designs = [dict(zip(self.FIELDS, row)) for row in rows]
+        for design in designs:
+            for field in self.JSON_FIELDS:
+                design[field] = json.loads(design[field])
+        return designs
+
+    def exact(self, model, simulator, input_voltage, ac, targets, budget=0, target=None):
+        '''Returns the best design for the same request, optimized with at least budget or reached
+        target fitness, or None'''
+        same = [x for x in self.designs(model, simulator) if x['input_voltage'] == input_voltage and
+                x['ac'] == list(ac) and np.allclose(x['targets'], targets, rtol=0, atol=1e-9) and
+                ((x['budget'] or 0) >= budget or target is not None and x['fitness'] <= target)]
+        return min(same, key=lambda x: x['fitness']) if same else None
+
+    def nearest(self, model, simulator, input_voltage, targets, k=5):
+        '''Returns up to k designs, nearest to request in input and output voltages space'''
+        designs = [x for x in self.designs(model, simulator) if len(x['targets']) == len(targets)]
+        point = np.array([input_voltage] + list(targets))
+        distance = lambda x: np.sqrt(((np.array([x['input_voltage']] + x['targets']) - point)**2).sum())
+        return sorted(designs, key=distance)[:k]
+
+class Surrogate:
+    '''Ridge regression of output voltages on logarithms of component values and their squares,
+    fitted online on simulated samples of single circuit. Children are bred oversample times
+    more than needed and only the ones with the best predicted fitness are simulated'''
+    def __init__(self, oversample=4, alpha=0.1):
+        self.oversample = oversample
+        self.alpha = alpha
+        self.x = []
+        self.y = []
+        self.known = set()
+        self.coef = None
+        self.errors = []
+
+    def __len__(self):
+        return len(self.y)
+
+    def ready(self):
+        return len(self) >= 10
+
+    def features(self, values):
+        x = np.log(np.abs(np.asarray(values, dtype=float)) + 1e-30)
+        z = (x - self.mean)/self.std
+        return np.hstack([np.ones((len(z), 1)), z, z**2])
+
+    def add(self, values, outputs):
+        '''Adds simulated samples, checks prediction error on new samples'''
+        new = [k for k, row in enumerate(values) if not row.tobytes() in self.known]
+        if not new:
+            return
+        if self.coef is not None:
+            self.errors.append(np.abs(self.predict(values[new]) - np.array(outputs)[new]).mean())
+        for k in new:
+            self.known.add(values[k].tobytes())
+            self.x.append(values[k])
+            self.y.append(outputs[k])
+        self.fit()
+
+    def fit(self):
+        x = np.log(np.abs(np.array(self.x)) + 1e-30)
+        self.mean = x.mean(axis=0)
+        self.std = x.std(axis=0) + 1e-9
+        features = self.features(self.x)
+        penalty = self.alpha*np.eye(features.shape[1])
+        penalty[0, 0] = 0  #intercept is not penalized
+        self.coef = np.linalg.solve(features.T @ features + penalty, features.T @ np.array(self.y))
+
+    @PROFILER.timed('surrogate')
+    def predict(self, values):
+        '''Returns predicted output voltages matrix (n_samples x n_outputs)'''
+        return self.features(values) @ self.coef
+
+    def screen(self, values, v_out, n):
+        '''Returns n rows of values matrix with the best predicted fitness'''
+        fitness = np.sqrt(((self.predict(values) - np.array(v_out))**2).sum(axis=1))
+        return values[np.argsort(fitness)[:n]]
+
+    def report(self):
+        '''Prints number of training samples and the last prediction error'''
+        if self.errors:
+            print('Surrogate: {} samples, prediction error {:.4g}V'.format(len(self), self.errors[-1]))
+
+def asc_to_netlist(filename):
+    '''Creates SPICE netlist lines for two-pin components with known symbol geometry and SPICE
+    directives, node names are taken from flags, connection is found by wires. Netlist is complete
+    if schematic has no other symbols (see unknown_symbols())'''
+    schematic = as_schematic(filename)
+    netlist = ['* {}\n'.format(filename if isinstance(filename, str) else 'schematic')]
+    for name, nodes in schematic.nets().items():
+        netlist.append('{} {} {} {}\n'.format(name, nodes[0], nodes[1], schematic.components[name].get('Value', '')))
+    for item in schematic.items:
+        directive = re.match(r'TEXT \S+ \S+ \S+ \S+ !(.*)', item) if isinstance(item, str) else None
+        if directive:
+            netlist += [x+'\n' for x in directive.group(1).split('\\n')]
+    netlist.append('.end\n')
+    return netlist
+
+def unknown_symbols(filename):
+    '''Lists names of .asc file or Schematic symbols without known pin geometry'''
+    return [x.name for x in as_schematic(filename).symbols() if x.name and not x.pins()]
+
+def time_to_number(string):
+    '''Converts SPICE time like 10m, 500u or 1.5ms to float format'''
+    return exp_to_number(re.sub(r's$', '', string).replace('u', 'µ'))
+
+def tran_stop_time(text, default=1e-3):
+    '''Finds transient simulation stop time in .tran directive of LTSpice .asc text'''
+    tran = re.search(r'!\.tran ([^\n\\]*)', text, re.I)
+    if not tran:
+        return default
+    numbers = [x for x in tran.group(1).split() if re.match(r'^[0-9\.]', x)]
+    stop_time = numbers[1] if len(numbers) > 1 else numbers[0]
+    return time_to_number(stop_time)
+
+def scale_tran_time(schematic, fraction):
+    '''Multiplies .tran stop time (and start time if defined) in Schematic by fraction (in place)'''
+    def scale(match):
+        words = match.group(2).split(' ')
+        numbers = [k for k, x in enumerate(words) if re.match(r'^[0-9\.]', x)]
+        for k in (numbers[1:3] if len(numbers) > 1 else numbers):
+            words[k] = '{:.6g}'.format(time_to_number(words[k])*fraction)
+        return match.group(1) + ' '.join(words)
+    for i, item in enumerate(schematic.items):
+        if isinstance(item, str) and item.startswith('TEXT'):
+            schematic.items[i] = re.sub(r'(!\.tran )([^\\]*)', scale, item, flags=re.I)
+    return schematic
+
+def extrapolate_final_value(t, v, tail=0.3):
+    '''Estimates settled value of truncated trace. Tail of simulated time is divided to three windows,
+    if window averages converge geometrically (exponential settling), limit is found by
+    Aitken delta-squared extrapolation, otherwise the last window average is returned'''
+    t = np.abs(np.asarray(t, dtype=float))
+    grid = np.linspace(t[-1]*(1-tail), t[-1], 150)
+    a1, a2, a3 = np.interp(grid, t, v).reshape(3, -1).mean(axis=1)
+    d1, d2 = a2-a1, a3-a2
+    if d1 != 0 and 0 < d2/d1 < 1:
+        return a3 + d2*(d2/d1)/(1-d2/d1)
+    return a3
+
+def spice_trace_name(name, k=1):
+    '''Converts ngspice trace name to LTSpice one in lower case: node to v(node), l1#branch to i(l1),
+    @r1[i] to i(r1). k is trace number, the first trace (time or frequency) keeps its name'''
+    name = name.lower()
+    if name.endswith('#branch'):
+        return 'i({})'.format(name[:-len('#branch')])
+    current = re.match(r'^@([^\[]+)\[i\]$', name)
+    if current:
+        return 'i({})'.format(current.group(1))
+    return 'v({})'.format(name) if k and not '(' in name else name
+
+def read_ascii_raw(filename, traces=None):
+    '''Reads traces from ASCII SPICE .raw file, returns {trace name: values array}'''
+    file = open(filename, 'r', encoding=ASC_ENCODING)
+    text = file.read()
+    file.close()
+    header, values = text.split('Values:', 1)
+    names = re.findall(r'^\s+\d+\s+(\S+)\s+\S+\s*$', header.split('Variables:', 1)[1], re.M)
+    names = [spice_trace_name(name, k) for k, name in enumerate(names)]
+    data = np.array(values.split(), dtype=float).reshape(-1, len(names)+1)[:, 1:]
+    wanted = [name.lower() for name in traces] if traces else names
+    return {name: data[:, k] for k, name in enumerate(names) if name in wanted}
+
+class RawFile:
+    '''Selective reader of binary LTSpice and ngspice .raw files. Only header is parsed, data section
+    is memory mapped and only requested traces (or the last points of them) are decoded, trace views are
+    zero copy. Data layout is found by data size: float64 time and float32 traces (LTSpice), all float64
+    (LTSpice 'double' flag, ngspice) or complex128, point by point or trace by trace ('fastaccess' flag).
+    Trace names are in lower case, ngspice names are converted by spice_trace_name().
+    ASCII .raw files are read by read_ascii_raw()'''
+    def __init__(self, filename):
+        self.filename = filename
+        header, self.offset, binary = self.read_header(filename)
+        fields = dict(re.findall(r'^([\w\. ]+):[ \t]*(.*?)\s*$', header.split('\nVariables:')[0], re.M))
+        self.flags = fields.get('Flags', '').lower().split()
+        self.n_points = int(fields['No. Points'])
+        self.names = [spice_trace_name(x, k) for k, x in enumerate(re.findall(r'^\s+\d+\s+(\S+)\s+\S+.*$',
+                                                                              header.split('\nVariables:', 1)[1],
+                                                                              re.M))]
+        self.index = {name: k for k, name in enumerate(self.names)}
+        self.step_ranges = None
+        self.data = None
+        if not binary:
+            return
+        n = len(self.names)
+        size = os.path.getsize(filename) - self.offset
+        for formats in [['<f8'] + ['<f4']*(n-1), ['<f8']*n, ['<c16']*n]:
+            itemsizes = [np.dtype(x).itemsize for x in formats]
+            if size == self.n_points*sum(itemsizes):
+                break
+        else:
+            raise ValueError('{}: {} data bytes don\'t match {} points of {} traces'.format(
+                             filename, size, self.n_points, n))
+        self.formats = formats
+        if 'fastaccess' in self.flags:
+            self.offsets = list(np.cumsum([0] + itemsizes[:-1])*self.n_points)
+            self.strides = itemsizes
+        else:
+            self.offsets = list(np.cumsum([0] + itemsizes[:-1]))
+            self.strides = [sum(itemsizes)]*n
+        self.data = np.memmap(filename, np.uint8, 'r', self.offset, (size,)) if size else np.zeros(0, np.uint8)
+
+    @staticmethod
+    def read_header(filename, chunk_size=65536):
+        '''Reads header text of .raw file (UTF-16 for LTSpice XVII), returns header, data offset
+        and True for binary data'''
+        file = open(filename, 'rb')
+        data = b''
+        while True:
+            chunk = file.read(chunk_size)
+            data += chunk
+            encoding = 'utf-16-le' if data[1:2] == b'\x00' else ASC_ENCODING
+            for marker in ['Binary:\n', 'Values:\n']:
+                found = data.find(marker.encode(encoding))
+                if found >= 0:
+                    file.close()
+                    return data[:found].decode(encoding), found + len(marker.encode(encoding)), marker == 'Binary:\n'
+            if not chunk:
+                file.close()
+                raise ValueError('{} is not SPICE .raw file'.format(filename))
+
+    def view(self, name):
+        '''Returns zero copy view of trace values of all steps'''
+        k = self.index[name.lower()]
+        return np.ndarray((self.n_points,), self.formats[k], self.data, self.offsets[k], (self.strides[k],))
+
+    def steps(self):
+        '''Returns list of (start, stop) point ranges of .step runs, time restarts in every step'''
+        if self.step_ranges is None:
+            starts = [0]
+            if 'stepped' in self.flags and self.data is not None:
+                t = np.abs(self.view(self.names[0]).real)
+                starts += [int(x)+1 for x in np.flatnonzero(np.diff(t) < 0)]
+            self.step_ranges = list(zip(starts, starts[1:] + [self.n_points]))
+        return self.step_ranges
+
+    def read(self, traces=None, step=0, tail=None):
+        '''Returns {trace name: values array} of step (all traces if traces is None), only the last
+        tail points if tail is defined. Traces, missing in file, are skipped. Values are copied,
+        so file can be removed after close()'''
+        if self.data is None:
+            result = read_ascii_raw(self.filename, traces)
+            return {name: values[-tail:] if tail else values for name, values in result.items()}
+        start, stop = self.steps()[step]
+        if tail:
+            start = max(start, stop - tail)
+        names = [x.lower() for x in traces if x.lower() in self.index] if traces else self.names
+        result = {}
+        for name in names:
+            values = self.view(name)[start:stop]
+            values = values.copy() if values.dtype.kind == 'c' else values.astype(float)
+            result[name] = np.abs(values) if self.index[name] == 0 and name == 'time' else values
+        return result
+
+    def close(self):
+        '''Releases memory mapping, views returned by view() keep it open'''
+        self.data = None
+
+def read_result(raw, traces=None, step=0, tail=None, sample=None, keep=None):
+    '''Reads traces of step from RawFile. keep is BestTraces: only if final values of traces improve
+    its fitness, keep traces of sample are read in full and offered to it'''
+    result = raw.read(traces, step, tail)
+    if keep:
+        outputs = [float(result[x.lower()][-1]) for x in traces]
+        if keep.improves(outputs):
+            keep.offer(sample, outputs, raw.read(keep.traces + list(traces), step))
+    return result
+
+@PROFILER.timed('raw read')
+def read_raw(filename, traces=None, step=0, tail=None, sample=None, keep=None):
+    '''Reads traces of step from .raw file, only the last tail points if tail is defined, see RawFile
+    and read_result()'''
+    raw = RawFile(filename)
+    result = read_result(raw, traces, step, tail, sample, keep)
+    raw.close()
+    return result
+
+def read_simulation_log(filename):
+    '''Finds simulator statistics in LTSpice or ngspice .log file: elapsed time, number of
+    accepted and rejected time points. LTSpice XVII writes log in UTF-16'''
+    if not os.path.exists(filename):
+        return {}
+    file = open(filename, 'rb')
+    data = file.read()
+    file.close()
+    text = data.decode('utf-16-le', 'ignore') if b'\x00' in data[:200] else data.decode(ASC_ENCODING)
+    patterns = {'elapsed': r'(?:Total elapsed time|Total analysis time \(seconds\))\s*[:=]\s*([0-9\.e+-]+)',
+                'timepoints': r'(?:Transient timepoints|Accepted timepoints)\s*[:=]\s*(\d+)',
+                'rejected': r'Rejected timepoints\s*[:=]\s*(\d+)',
+                'iterations': r'Transient iterations\s*[:=]\s*(\d+)'}
+    stats = {}
+    for key, pattern in patterns.items():
+        found = re.search(pattern, text, re.I)
+        if found:
+            stats[key] = float(found.group(1)) if key == 'elapsed' else int(found.group(1))
+    return stats
+
+def remove_simulation_files(file):
+    '''Removes simulation files with file name without extension'''
+    for ext in ['.raw', '.op.raw', '.log', '.net']:
+        if os.path.exists(file + ext):
+            os.remove(file + ext)
+
+def step_parameter_name(component_name):
+    '''Creates LTSpice parameter name for component value'''
+    return 'p_'+re.sub(r'\W', '_', component_name)
+
+class BestTraces:
+    '''Keeps traces of the simulated sample with the best fitness as matrix (row per trace),
+    so final circuit is derated without extra simulation. Missing traces are NaN rows'''
+    def __init__(self, traces, v_out):
+        self.traces = list(traces)
+        self.v_out = np.array(v_out)
+        self.fitness = np.inf
+        self.sample = None
+        self.matrix = None
+        self.lock = threading.Lock()
+
+    def fitness_of(self, outputs):
+        return float(np.sqrt(((np.array(outputs)-self.v_out)**2).sum()))
+
+    def improves(self, outputs):
+        '''True if sample outputs are closer to v_out than kept ones, so its traces should be read'''
+        with self.lock:
+            return self.fitness_of(outputs) < self.fitness
+
+    def offer(self, sample, outputs, result):
+        '''Keeps sample traces if sample outputs are closer to v_out than kept ones'''
+        fitness = self.fitness_of(outputs)
+        with self.lock:
+            if fitness < self.fitness:
+                length = len(next(iter(result.values())))
+                missing = np.full(length, np.nan)
+                self.fitness, self.sample = fitness, dict(sample)
+                self.matrix = np.array([result.get(x.lower(), missing) for x in self.traces],
+                                       dtype=float).reshape(-1, length)
+
+    def get(self, sample):
+        '''Returns kept trace matrix if it belongs to sample, otherwise None'''
+        with self.lock:
+            return self.matrix if self.sample == dict(sample) else None
+
+class Simulator(abc.ABC):
+    '''Circuit simulator interface. simulate() takes .asc circuit file and samples dictionary
+    {index: components dictionary} and returns {index: {trace name: values array}}.
+    Trace names are in lower case, traces=None returns all traces, tail returns only the last points,
+    keep is BestTraces, offered the full traces of samples which improve it (see read_result()).
+    Samples are simulated in pool of jobs workers, shared by all simulate() calls.
+    Simulation longer than timeout seconds is stopped, failures=True returns None for failed samples
+    instead of raising exception'''
+    def __init__(self, jobs=1):
+        self.jobs = jobs
+        self.pool = ThreadPoolExecutor(jobs)
+        self.timeout = None
+        self.busy_time = 0
+        self.busy_lock = threading.Lock()
+
+    def submit(self, function, *args, samples=1):
+        '''Submits task of simulating samples to workers pool, counts workers busy time'''
+        submitted = time.time()
+        def task():
+            start = time.time()
+            PROFILER.add('queue wait', submitted, start - submitted)
+            try:
+                with PROFILER.span('simulation', samples=samples):
+                    return function(*args)
+            finally:
+                with self.busy_lock:
+                    self.busy_time += time.time() - start
+        return self.pool.submit(task)
+
+    @staticmethod
+    def gather(futures, failures=False):
+        '''Returns {index: result} of {index: future} dictionary. Future result may be dictionary of
+        several samples results. Failed samples are None if failures is True'''
+        results = {}
+        for i, future in futures.items():
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                if not failures:
+                    raise
+                print('Sample {} failed: {}: {}'.format(i, type(e).__name__, e))
+                results[i] = None
+        return results
+
+    @abc.abstractmethod
+    def netlist(self, filename):
+        '''Creates SPICE netlist for .asc file, returns netlist file name'''
+
+    @abc.abstractmethod
+    def simulate(self, filename, samples, traces=None, tail=None, keep=None, failures=False):
+        pass
+
+    def final_values(self, filename, samples, traces, keep=None, failures=False):
+        '''Returns {index: list of final trace values}. keep is BestTraces, traces of samples, which
+        improve it, are also read and offered to it. failures=True returns None for failed samples'''
+        results = self.simulate(filename, samples, traces, 1, keep, failures)
+        return {i: None if result is None else [float(result[name.lower()][-1]) for name in traces]
+                for i, result in results.items()}
+
+class LTSpiceSimulator(Simulator):
+    '''LTSpice simulator, running through PyLTSpice SimCommander.
+    evaluation='sample' runs LTSpice for every sample, sample i writes to *_{i+1} files,
+    evaluation='step' simulates samples with .step parameter sweep, divided into jobs runs'''
+    def __init__(self, jobs=1, evaluation='sample'):
+        from PyLTSpice.LTSpiceBatch import SimCommander
+        super().__init__(jobs)
+        self.SimCommander = SimCommander
+        self.evaluation = evaluation
+
+    def netlist(self, filename):
+        return ltspice_netlist(filename)
+
+    def run(self, net_file, run_name, values, instructions=()):
+        '''Simulates netlist with changed component values and added instructions,
+        returns simulation file name without extension'''
+        LTC = self.SimCommander(net_file, parallel_sims=1, timeout=self.timeout)
+        for key, value in values.items():
+            LTC.set_component_value(key, value)
+        if instructions:
+            LTC.add_instructions(*instructions)
+        file = os.path.join(os.path.dirname(net_file), run_name)
+        with PROFILER.span('simulator run') as stats:
+            LTC.run(run_filename=file+'.net')
+            LTC.wait_completion()
+            stats.update(read_simulation_log(file+'.log') if PROFILER.enabled else {})
+        return file
+
+    def run_sample(self, net_file, run_name, sample, traces, tail=None, keep=None):
+        file = self.run(net_file, run_name, sample)
+        result = read_raw(file+'.raw', traces, tail=tail, sample=sample, keep=keep)
+        remove_simulation_files(file)
+        return result
+
+    def simulate(self, filename, samples, traces=None, tail=None, keep=None, failures=False):
+        if self.evaluation == 'step' and len(samples) > 1:
+            return self.simulate_stepped(filename, samples, traces, tail, keep, failures)
+        net_file = self.netlist(filename)
+        radic = os.path.basename('.'.join(filename.split('.')[0:-1]))
+        futures = {i: self.submit(self.run_sample, net_file, radic+'_'+str(i+1), sample, traces, tail, keep)
+                   for i, sample in samples.items()}
+        return self.gather(futures, failures)
+
+    def run_batch(self, net_file, run_name, samples, batch, traces, tail=None, keep=None):
+        '''Simulates batch of samples with .step parameter sweep, component values are replaced
+        by {param} expressions, taken from table by step number'''
+        names = list(samples[batch[0]].keys())
+        values = {name: '{'+step_parameter_name(name)+'}' for name in names}
+        instructions = ['.step param idx list '+' '.join(str(j+1) for j in range(len(batch)))]
+        for name in names:
+            table = ','.join('{},{:.6e}'.format(j+1, samples[i][name]) for j, i in enumerate(batch))
+            instructions.append('.param {}=table(idx,{})'.format(step_parameter_name(name), table))
+        file = self.run(net_file, run_name, values, instructions)
+        with PROFILER.span('raw read'):
+            raw = RawFile(file+'.raw')
+            results = {i: read_result(raw, traces, j, tail, samples[i], keep) for j, i in enumerate(batch)}
+            raw.close()
+        remove_simulation_files(file)
+        return results
+
+    def simulate_stepped(self, filename, samples, traces=None, tail=None, keep=None, failures=False):
+        '''Simulates samples in jobs .step sweep runs'''
+        net_file = self.netlist(filename)
+        radic = os.path.basename('.'.join(filename.split('.')[0:-1]))
+        indices = list(samples.keys())
+        n_runs = max(1, min(self.jobs, len(indices)))
+        batches = [indices[k::n_runs] for k in range(n_runs)]
+        futures = {k: self.submit(self.run_batch, net_file, radic+'_step'+str(k+1), samples, batch, traces, tail,
+                                  keep, samples=len(batch))
+                   for k, batch in enumerate(batches)}
+        results = {}
+        for k, result in self.gather(futures, failures).items():
+            results.update(result or {i: None for i in batches[k]})
+        return results
+
+def ltspice_netlist(filename):
+    '''Creates SPICE netlist for .asc file with LTSpice, returns netlist file name'''
+    from PyLTSpice.LTSpiceBatch import SimCommander
+    SimCommander(filename)
+    return '.'.join(filename.split('.')[0:-1])+'.net'
+
+class NgspiceSimulator(Simulator):
+    '''ngspice simulator in batch mode. ngspice can't read .asc schematics, so netlist is created
+    from Schematic (see asc_to_netlist()), only circuits with symbols of unknown pin geometry are
+    netlisted by LTSpice. Netlist is kept for circuit file content, component values are replaced in
+    netlist text. Resistor currents are saved, so ngspice traces have LTSpice names (see spice_trace_name()).
+    All circuit models should be ngspice compatible'''
+    def __init__(self, jobs=1, command='ngspice'):
+        super().__init__(jobs)
+        self.command = command
+        self.netlists = {}
+        self.lock = threading.Lock()
+
+    def netlist_lines(self, filename):
+        '''Returns netlist lines of .asc file'''
+        digest = file_hash(filename)
+        with self.lock:
+            if digest in self.netlists:
+                return self.netlists[digest]
+        if unknown_symbols(filename):
+            netlist_file = open(ltspice_netlist(filename), 'r', encoding=ASC_ENCODING)
+            lines = netlist_file.readlines()
+            netlist_file.close()
+        else:
+            lines = asc_to_netlist(filename)
+        lines = [x.replace('\u00b5', 'u') for x in lines]
+        resistors = ['@{}[i]'.format(x.split()[0].lower()) for x in lines if x[:1].lower() == 'r']
+        end = [k for k, x in enumerate(lines) if x.strip().lower() == '.end']
+        lines.insert(end[-1] if end else len(lines), ' '.join(['.save all'] + resistors)+'\n')
+        with self.lock:
+            self.netlists[digest] = lines
+        return lines
+
+    def netlist(self, filename):
+        net_file_name = '.'.join(filename.split('.')[0:-1])+'.net'
+        file = open(net_file_name, 'w', encoding=ASC_ENCODING)
+        file.writelines(self.netlist_lines(filename))
+        file.close()
+        return net_file_name
+
+    def run(self, netlist, file, sample, traces, tail=None, keep=None):
+        '''Writes netlist with sample values to file.net, simulates it and reads file.raw'''
+        sample = {key.lower(): value for key, value in sample.items()}
+        lines = []
+        for line in netlist:
+            words = line.split()
+            if words and words[0].lower() in sample:
+                words[3] = '{:.6e}'.format(sample[words[0].lower()])
+                line = ' '.join(words)+'\n'
+            if words and words[0].lower() == '.tran' and words[-1] == 'startup':
+                line = ' '.join(words[:-1])+'\n'  #LTSpice specific option
+            lines.append(line)
+        net_file = open(file+'.net', 'w', encoding=ASC_ENCODING)
+        net_file.writelines(lines)
+        net_file.close()
+        log_file = open(file+'.log', 'w')
+        with PROFILER.span('simulator run') as stats:
+            try:
+                subprocess.run([self.command, '-b', '-r', file+'.raw', file+'.net'],
+                               stdout=log_file, stderr=subprocess.STDOUT, timeout=self.timeout)
+            finally:
+                log_file.close()
+            stats.update(read_simulation_log(file+'.log') if PROFILER.enabled else {})
+        result = read_raw(file+'.raw', traces, tail=tail, sample=sample, keep=keep)
+        remove_simulation_files(file)
+        return result
+
+    def simulate(self, filename, samples, traces=None, tail=None, keep=None, failures=False):
+        netlist = self.netlist_lines(filename)
+        radic = '.'.join(filename.split('.')[0:-1])
+        futures = {i: self.submit(self.run, netlist, radic+'_'+str(i+1), sample, traces, tail, keep)
+                   for i, sample in samples.items()}
+        return self.gather(futures, failures)
+
+def unit_hash(*parts):
+    '''Deterministic pseudo-random number in range [0:1] for parts strings'''
+    digest = hashlib.sha1('|'.join(str(x) for x in parts).encode()).hexdigest()
+    return int(digest[:8], 16)/0xffffffff
+
+class StandInSimulator(Simulator):
+    '''Fast deterministic in-process stand-in for circuit simulator, for profiling and testing
+    without LTSpice. Output node voltages are nominal voltages from database_file, multiplied by
+    (value/template value)**exponent for every component, with pseudo-random exponents.
+    Other traces are plausible first order step responses. delay is simulation time per sample'''
+    def __init__(self, jobs=1, database_file='Power_supply_data.csv', delay=0, points=200):
+        super().__init__(jobs)
+        self.delay = delay
+        self.points = points
+        import pandas as pd
+        df = pd.read_csv(database_file, sep = ';').dropna()
+        self.nominal = {row['model_file']: dict(zip([x.lower() for x in str_to_str_list(row['output_node'])],
+                                                    str_to_float_list(row['output_voltage'])))
+                        for _, row in df.iterrows()}
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def netlist(self, filename):
+        net_file_name = '.'.join(filename.split('.')[0:-1])+'.net'
+        file = open(net_file_name, 'w', encoding=ASC_ENCODING)
+        file.writelines(asc_to_netlist(filename))
+        file.close()
+        return net_file_name
+
+    def model(self, filename):
+        '''Finds template values, nominal outputs and netlist of circuit file'''
+        digest = file_hash(filename)
+        with self.lock:
+            if not digest in self.models:
+                schematic = Schematic(filename)
+                template, _ = get_netlist_components(schematic)
+                name = os.path.basename(filename)
+                matches = [x for x in self.nominal.keys() if name.endswith(x)]
+                name = max(matches, key=len) if matches else name
+                nominal = self.nominal.get(name, {})
+                netlist = [[component]+nodes for component, nodes in schematic.nets().items()]
+                stop_time = tran_stop_time(''.join(schematic.text()))
+                self.models[digest] = (name, template, nominal, netlist, stop_time)
+            return self.models[digest]
+
+    def run(self, model, sample, traces, tail=None, keep=None):
+        name, template, nominal, netlist, stop_time = model
+        if self.delay:
+            time.sleep(min(self.delay, self.timeout or self.delay))
+            if self.timeout and self.delay > self.timeout:
+                raise TimeoutError('simulation takes more than {}s'.format(self.timeout))
+        t = np.linspace(0, stop_time, self.points)
+        def settle(*parts):
+            tau = stop_time*(0.02 + 0.15*unit_hash(name, 'tau', *parts))
+            return 1 - np.exp(-t/tau)
+        def output(node):
+            v = nominal.get(node, 1.0)
+            for component, value in sample.items():
+                exponent = (2*unit_hash(name, node, component) - 1)**3
+                v *= (value/template[component])**exponent if template.get(component) else 1
+            return v
+        result = {'time': t}
+        for node in nominal.keys():
+            result[node] = output(node)*settle(node)
+        v_ref = max([abs(x) for x in nominal.values()] + [1.0])
+        for words in netlist:
+            component, nodes = words[0], words[1:3]
+            for node in nodes:
+                if node != '0' and not 'v({})'.format(node.lower()) in result:
+                    result['v({})'.format(node.lower())] = v_ref*unit_hash(name, node)*settle(node)
+            value = sample.get(component, template.get(component, 1.0))
+            if component[0].lower() == 'r':
+                current = v_ref*unit_hash(name, component)/max(value, 1e-3)
+            else:
+                current = 0.1*v_ref*unit_hash(name, component)
+            result['i({})'.format(component.lower())] = current*settle(component)
+        def select(traces):
+            if not traces:
+                return result
+            return {trace.lower(): result.get(trace.lower(), np.zeros(self.points)) for trace in traces}
+        selected = select(traces)
+        if keep:
+            outputs = [float(selected[x.lower()][-1]) for x in traces]
+            if keep.improves(outputs):
+                keep.offer(sample, outputs, select(keep.traces + list(traces)))
+        return {name: values[-tail:] for name, values in selected.items()} if tail else selected
+
+    def simulate(self, filename, samples, traces=None, tail=None, keep=None, failures=False):
+        model = self.model(filename)
+        futures = {i: self.submit(self.run, model, sample, traces, tail, keep) for i, sample in samples.items()}
+        return self.gather(futures, failures)
+
+SIMULATORS = {'ltspice': LTSpiceSimulator,
+              'ngspice': NgspiceSimulator,
+              'standin': StandInSimulator}
+
+def make_simulator(name='ltspice', jobs=1, evaluation='sample'):
+    '''Creates simulator by name'''
+    if name == 'ltspice':
+        return LTSpiceSimulator(jobs, evaluation)
+    return SIMULATORS[name](jobs)
+
+@PROFILER.timed('screening')
+def screen_samples(filename, samples, out_node_list, v_out, fidelity, simulator, keep=None):
+    '''Multi-fidelity simulation. fidelity is (time fraction, promoted fraction) tuple.
+    All samples are simulated with .tran time multiplied by time fraction and final output voltages
+    are extrapolated, then promoted fraction of samples with the best estimated fitness
+    is simulated with full time, keep is BestTraces for full time simulations.
+    Returns outputs dictionary (None for failed samples) and set of fully simulated indices'''
+    time_fraction, promoted_fraction = fidelity
+    short_file = os.path.join(os.path.dirname(filename), 'short_'+os.path.basename(filename))
+    scale_tran_time(Schematic(filename), time_fraction).write(short_file)
+    start = time.time()
+    traces = simulator.simulate(short_file, samples, ['time']+list(out_node_list), failures=True)
+    short_duration = time.time() - start
+    os.remove(short_file)
+    outputs, truncated = {}, {}
+    for i, result in traces.items():
+        if result is None:
+            outputs[i] = None
+            continue
+        outputs[i] = [float(extrapolate_final_value(result['time'], result[x.lower()])) for x in out_node_list]
+        truncated[i] = [float(result[x.lower()][-1]) for x in out_node_list]
+    estimates = {i: np.sqrt(sum((np.array(x)-np.array(v_out))**2)) if x else np.inf for i, x in outputs.items()}
+    n_promoted = int(np.ceil(promoted_fraction*len(samples)))
+    promoted = sorted(estimates.keys(), key=lambda i: estimates[i])[:n_promoted]
+    start = time.time()
+    exact = simulator.final_values(filename, {i: samples[i] for i in promoted}, out_node_list, keep, True)
+    full_duration = time.time() - start
+    compared = [i for i in promoted if outputs[i] and exact[i]]
+    errors = np.array([np.array(outputs[i])-np.array(exact[i]) for i in compared])
+    truncated_errors = np.array([np.array(truncated[i])-np.array(exact[i]) for i in compared])
+    print('Fidelity {}: {} samples in {:.2f}s, {} full samples in {:.2f}s'.format(
+          time_fraction, len(samples), short_duration, len(promoted), full_duration))
+    if len(compared):
+        print('Extrapolation error mean {:.4g}V, max {:.4g}V (truncated value error mean {:.4g}V)'.format(
+              np.abs(errors).mean(), np.abs(errors).max(), np.abs(truncated_errors).mean()))
+    outputs.update(exact)
+    return outputs, set(exact.keys())
+
+@PROFILER.timed('selection')
+def selection(population, filename, out_node_list=["V(OUT)"], v_out = [5], fraction=0.2, simulator=None,
+              cache=None, cache_context=(), fidelity=None, surrogate=None, keep=None):
+    '''Performs selection of samples with the best fitness function values.
+    Samples found in cache are not simulated. fidelity is (time fraction, promoted fraction) tuple
+    for multi-fidelity simulation, see screen_samples(). Exactly simulated samples are added
+    to surrogate model if defined, keep is BestTraces of simulated samples. Failed (for example timed out)
+    samples have infinite fitness and aren't cached or selected. Returns selected Population,
+    the best sample dictionary, selection level and statistics dictionary with the best fitness,
+    number of simulations and fitness of selected samples'''
+    simulator = simulator or LTSpiceSimulator()
     n = len(population)
+    outputs = [None]*n
+    keys = [None]*n
+    to_simulate = {}
+    exact_rows = set()
+    n_simulated = 0
+    for i, row in enumerate(population.values):
+        if cache:
+            keys[i] = cache.key(tuple(cache_context) + tuple(out_node_list), population.names, row)
+            outputs[i] = cache.get(keys[i])
+        else:
+            keys[i] = row.tobytes()
+        if outputs[i] is None and not keys[i] in to_simulate:
+            to_simulate[keys[i]] = i
+        elif outputs[i] is not None:
+            exact_rows.add(i)
+    if to_simulate:
+        samples = {i: population.sample(i) for i in to_simulate.values()}
+        start = time.time()
+        if fidelity:
+            simulated, exact = screen_samples(filename, samples, out_node_list, v_out, fidelity, simulator, keep)
+        else:
+            simulated = simulator.final_values(filename, samples, out_node_list, keep, True)
+            exact = simulated.keys()
+        n_simulated = len(samples) + (len(exact) if fidelity else 0)
+        duration = time.time() - start
+        print('Simulated {} samples in {:.2f}s, {:.3f}s per sample'.format(len(samples), duration,
+                                                                            duration/len(samples)))
+        for i, v_out_simulated in simulated.items():
+            outputs[i] = v_out_simulated
+            if i in exact and v_out_simulated is not None:
+                exact_rows.add(i)
+                if cache:
+                    cache.put(keys[i], v_out_simulated)
     for i in range(n):
-        file = '.'.join(filename.split('.')[0:-1])+'_'+str(i+1)
-        LTR = LTSpiceRawRead(file+'.raw')
-        v_out_simulated = []
-        for out_node in out_node_list:
-            v_out_simulated.append(LTR.get_trace(out_node)[-1])
-        #remove LTSpice simulation files
-        for i in ['.raw', '.op.raw', '.log', '.net']: 
-            if os.path.exists(file + i):
-                os.remove(file + i)   
-        fitness = (sum((np.array(v_out_simulated)-np.array(v_out))**2))**0.5
-        fitness_scores.append(fitness)
+        if outputs[i] is None:  #duplicate of sample simulated in this generation or failed sample
+            outputs[i] = outputs[to_simulate[keys[i]]]
+    fitness_scores = np.array([np.sqrt(((np.array(x)-np.array(v_out))**2).sum()) if x is not None else np.inf
+                               for x in outputs])
+    if not np.isfinite(fitness_scores).any():
+        raise RuntimeError('all {} samples failed'.format(n))
     level = np.quantile(fitness_scores, fraction)
+    if not np.isfinite(level):
+        level = fitness_scores[np.isfinite(fitness_scores)].max()
     print('Selection level: {}'.format(level))
-    selected_scemes = [population[i] for i in range(n) if fitness_scores[i]<=level]
-    best_scheme = population[np.argmin(fitness)]
-    return selected_scemes, best_scheme, level
-
-def create_new_generation(population_tuple, filename, out_node, new_vout, deviation, fraction):
-    '''Performs selection-crossover-mutation'''
-    generated = []
-    population, component_types = population_tuple
-    selected, best, level = selection(population, filename, out_node, new_vout, fraction)
-    for i in range(0, len(population)-len(selected)):
-        [p1, p2] = random.sample(selected, 2)
-        c = mutation(crossover(p1, p2), component_types, deviation)
-        generated.append(c)
-    selected.extend(generated)
-    return (selected, component_types), best, level
+    if cache:
+        cache.report()
+    if surrogate is not None and exact_rows:
+        rows = sorted(exact_rows)
+        surrogate.add(population.values[rows], np.array([outputs[i] for i in rows]))
+        surrogate.report()
+    selected_scemes = population.subset(fitness_scores<=level)  #failed samples are above finite level
+    best_scheme = population.sample(int(np.argmin(fitness_scores)))
+    return selected_scemes, best_scheme, level, {'fitness': float(fitness_scores.min()), 'simulated': n_simulated,
+                                                 'selected': fitness_scores[fitness_scores<=level].tolist()}
+
+def create_new_generation(population, filename, out_node, new_vout, deviation, fraction, simulator=None,
+                          cache=None, cache_context=(), rng=None, fidelity=None, surrogate=None, keep=None):
+    '''Performs selection-crossover-mutation. If surrogate model is defined and trained,
+    children are pre-screened by predicted fitness'''
+    rng = rng or np.random.default_rng()
+    selected, best, level, stats = selection(population, filename, out_node, new_vout, fraction, simulator,
+                                      cache, cache_context, fidelity, surrogate, keep)
+    n_children = len(population)-len(selected)
+    screen = surrogate is not None and surrogate.ready()
+    n_bred = n_children*surrogate.oversample if screen else n_children
+    k = len(selected)
+    p1 = rng.integers(0, k, n_bred)
+    p2 = (p1 + rng.integers(1, max(k, 2), n_bred)) % k  #second parent differs from first
+    children = mutation(crossover(selected.values[p1], selected.values[p2], rng), selected.codes, deviation, rng)
+    if screen:
+        children = surrogate.screen(children, new_vout, n_children)
+    return selected.extend(children), best, level, stats
+
+def sensitivity_ranking(filename, template, out_node_list, simulator, cache=None, cache_context=(), step=0.2):
+    '''One-at-a-time sensitivity analysis. Template and every component value multiplied and divided
+    by (1+step) are simulated as one batch. Sensitivity is the largest relative output voltage change
+    per relative component value change. Ranking is stored in cache for cache_context (model file,
+    input voltage and simulator), so it is calculated once. Returns {component: sensitivity}'''
+    names = list(template.keys())
+    key = cache.key(tuple(cache_context) + ('sensitivity', step) + tuple(out_node_list), names,
+                    [template[x] for x in names]) if cache else None
+    ranking = cache.get(key) if cache else None
+    if ranking is None:
+        samples = {0: dict(template)}
+        for k, name in enumerate(names):
+            samples[2*k+1] = dict(template, **{name: template[name]*(1+step)})
+            samples[2*k+2] = dict(template, **{name: template[name]/(1+step)})
+        start = time.time()
+        outputs = {i: np.array(x) for i, x in simulator.final_values(filename, samples, out_node_list).items()}
+        print('Sensitivity analysis: {} samples in {:.2f}s'.format(len(samples), time.time()-start))
+        scale = np.maximum(np.abs(outputs[0]), 1e-3)
+        ranking = [float((np.abs(outputs[2*k+1]-outputs[2*k+2])/scale).max()/(2*np.log(1+step)))
+                   for k in range(len(names))]
+        if cache:
+            cache.put(key, ranking)
+    return dict(zip(names, ranking))
+
+def freeze_components(template, ranking, threshold):
+    '''Returns template of components with sensitivity not less than threshold part of the maximum one,
+    other components keep template values. Template is returned unchanged when ranking is empty or zero'''
+    if not any(ranking.values()):
+        print('Sensitivity analysis: no sensitive components, nothing is frozen')
+        return template
+    level = threshold*max(ranking.values())
+    active = {name: value for name, value in template.items() if ranking[name] >= level}
+    for name in sorted(ranking.keys(), key=lambda x: -ranking[x]):
+        print('{:<12}{:>10.4f}{}'.format(name, ranking[name], '' if name in active else '  frozen'))
+    print('Optimized components: {} of {}'.format(len(active), len(template)))
+    return active
+
+class EarlyStopping:
+    '''Convergence and budget criteria. Optimization is stopped when the best fitness isn't
+    improved by more than tolerance for patience generations, or when time_budget seconds or
+    simulation_budget simulations are spent. state continues budgets of resumed optimization'''
+    def __init__(self, tolerance=0, patience=None, time_budget=None, simulation_budget=None, state=None):
+        self.tolerance = tolerance
+        self.patience = patience
+        self.time_budget = time_budget
+        self.simulation_budget = simulation_budget
+        self.history = list(state['history']) if state else []
+        self.simulations = state['simulations'] if state else 0
+        self.start = time.time() - (state['elapsed'] if state else 0)
+
+    def update(self, fitness, simulations):
+        '''Adds the best fitness and number of simulations of generation'''
+        self.history.append(fitness)
+        self.simulations += simulations
+
+    def elapsed(self):
+        return time.time() - self.start
+
+    def reason(self):
+        '''Returns stopping reason or None'''
+        if self.patience and len(self.history) > self.patience:
+            if min(self.history[:-self.patience]) - min(self.history[-self.patience:]) <= self.tolerance:
+                return 'fitness not improved by more than {} in {} generations'.format(self.tolerance,
+                                                                                     self.patience)
+        if self.time_budget and self.elapsed() >= self.time_budget:
+            return 'time budget {}s is spent'.format(self.time_budget)
+        if self.simulation_budget and self.simulations >= self.simulation_budget:
+            return 'simulation budget {} is spent'.format(self.simulation_budget)
+        return None
+
+def save_checkpoint(filename, population, state):
+    '''Atomically writes Population and json serializable state dictionary to .npz file'''
+    temp_file = filename + '.tmp'
+    file = open(temp_file, 'wb')
+    np.savez(file, values=population.values, codes=population.codes,
+             names=np.array(population.names, dtype=str), state=np.array(json.dumps(state)))
+    file.flush()
+    os.fsync(file.fileno())
+    file.close()
+    os.replace(temp_file, filename)
+
+def load_checkpoint(filename):
+    '''Reads checkpoint file, returns Population and state dictionary'''
+    data = np.load(filename)
+    population = Population(data['names'].tolist(), data['codes'], data['values'])
+    return population, json.loads(str(data['state']))
+
+def steady_state_evolution(population, filename, out_node_list, v_out, deviation, simulator, cache=None,
+                           cache_context=(), rng=None, n_evaluations=120, elite_size=4, timeout=None,
+                           target=None, stopping=None, checkpoint=None, submitted=0, period=None, keep=None):
+    '''Asynchronous steady-state genetic algorithm without generation barrier. Up to simulator.jobs
+    samples are simulated at the same time, when any of them is finished, it goes to bounded
+    elite pool and new child of two random elites is submitted immediately. Initial population
+    samples are submitted first. Simulation longer than timeout seconds is scored as failure.
+    Evolution stops after n_evaluations samples or by EarlyStopping stopping criteria, checked every
+    period samples (len(population) by default), time to reach target fitness is reported.
+    checkpoint(elites Population, submitted) is called at the same time, submitted continues
+    resumed evolution. keep is BestTraces of simulated samples.
+    Returns the best sample dictionary and report dictionary'''
+    return asyncio.run(steady_state_loop(population, filename, out_node_list, v_out, deviation, simulator,
+                                         cache, cache_context, rng or np.random.default_rng(),
+                                         n_evaluations, elite_size, timeout, target, stopping,
+                                         checkpoint, submitted, period or len(population), keep))
+
+async def steady_state_loop(population, filename, out_node_list, v_out, deviation, simulator, cache,
+                            cache_context, rng, n_evaluations, elite_size, timeout, target, stopping,
+                            checkpoint, submitted, period, keep):
+    MIN_SD = 0.025 #minimum standard deviation
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(simulator.jobs)
+    pending = list(population.values)
+    elites = []  #(fitness, values, outputs) sorted by fitness
+    report = {'submitted': submitted, 'simulated': 0, 'cached': 0, 'failed': 0, 'time_to_target': None,
+              'stopped': None}
+    counts = {'finished': 0, 'simulated': 0}  #samples since the last stopping check
+    start = time.time()
+    busy_start = simulator.busy_time
+    def breed():
+        if pending:
+            return pending.pop(0)
+        sd = elites[-1][0]/max(v_out)+MIN_SD if len(elites) == elite_size else deviation
+        if len(elites) < 2:
+            parents = elites[0][1] if elites else population.values[0]
+            return mutation(parents[None], population.codes, sd, rng)[0]
+        i, j = rng.choice(len(elites), 2, replace=False)
+        child = crossover(elites[i][1][None], elites[j][1][None], rng)
+        return mutation(child, population.codes, sd, rng)[0]
+    async def worker():
+        while report['submitted'] < n_evaluations and not report['stopped']:
+            values = breed()
+            n = report['submitted']
+            report['submitted'] += 1
+            key = cache.key(tuple(cache_context) + tuple(out_node_list), population.names, values) if cache else None
+            outputs = cache.get(key) if cache else None
+            if outputs is None:
+                sample = dict(zip(population.names, values.tolist()))
+                try:
+                    result = await asyncio.wait_for(loop.run_in_executor(executor, simulator.final_values,
+                                                                         filename, {n: sample}, out_node_list,
+                                                                         keep),
+                                                    timeout)
+                except Exception as e:
+                    report['failed'] += 1
+                    counts['simulated'] += 1
+                    print('Sample {} failed: {}'.format(n, type(e).__name__))
+                    continue
+                outputs = result[n]
+                report['simulated'] += 1
+                counts['simulated'] += 1
+                if cache:
+                    cache.put(key, outputs)
+            else:
+                report['cached'] += 1
+            counts['finished'] += 1
+            fitness = float(np.sqrt(((np.array(outputs)-np.array(v_out))**2).sum()))
+            if len(elites) < elite_size or fitness < elites[-1][0]:
+                if not elites or fitness < elites[0][0]:
+                    print('Sample {}: best fitness {:.4g} at {:.2f}s'.format(n, fitness, time.time()-start))
+                elites.append((fitness, values, outputs))
+                elites.sort(key=lambda x: x[0])
+                del elites[elite_size:]
+            if target is not None and fitness <= target and report['time_to_target'] is None:
+                report['time_to_target'] = time.time() - start
+            if counts['finished'] >= period:
+                if stopping:
+                    stopping.update(elites[0][0], counts['simulated'])
+                    report['stopped'] = stopping.reason()
+                    if report['stopped']:
+                        print('Early stopping: {}'.format(report['stopped']))
+                if checkpoint:
+                    checkpoint(Population(population.names, population.codes, [x[1] for x in elites]),
+                               report['submitted'])
+                counts['finished'], counts['simulated'] = 0, 0
+    await asyncio.gather(*[worker() for _ in range(simulator.jobs)])
+    executor.shutdown(wait=False)
+    if not elites:
+        raise RuntimeError('all {} samples failed'.format(report['failed']))
+    report['wall_time'] = max(time.time() - start, 1e-6)
+    report['utilization'] = (simulator.busy_time-busy_start)/(report['wall_time']*simulator.jobs)
+    report['fitness'] = elites[0][0]
+    print('Steady-state evolution: {} samples ({} simulated, {} cached, {} failed) in {:.2f}s'.format(
+          report['submitted'], report['simulated'], report['cached'], report['failed'], report['wall_time']))
+    print_evolution_report(report, target)
+    return dict(zip(population.names, elites[0][1].tolist())), report
+
+def print_evolution_report(report, target):
+    '''Prints the best fitness, simulator workers utilization and time to reach target fitness'''
+    print('Best fitness: {:.4g}, worker utilization: {:.0%}'.format(report['fitness'], report['utilization']))
+    if target is not None:
+        if report['time_to_target'] is None:
+            print('Target fitness {} is not reached'.format(target))
+        else:
+            print('Target fitness {} is reached in {:.2f}s'.format(target, report['time_to_target']))
 
 def output_relevance(desired_voltage, real_voltage):
     '''Defines how close are desired and real output voltages'''
@@ -273,8 +1612,108 @@ def str_to_float_list(x):
     x = [i.strip() for i in x]
     return [float(i) for i in x]
 
-def get_best_scheme_match(request, database_file = 'Power_supply_data.csv'):
-    '''Finds circuit from database_file, that "best matches" request text'''
+def tokenize(text):
+    '''Splits text to lower case alphanumeric tokens'''
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+class SchemeIndex:
+    '''Compiled circuit database for request matching: inverted index of TF-IDF description
+    token weights and numeric arrays of input voltages, output counts and output voltages.
+    Index is saved to index_file and rebuilt when database_file content changes'''
+    COLUMNS = ['chip_name', 'description', 'input_voltage', 'output_voltage', 'output_node', 'model_file']
+
+    def __init__(self, database_file='Power_supply_data.csv', index_file=None):
+        self.database_file = database_file
+        self.index_file = index_file or os.path.splitext(database_file)[0]+'_index.npz'
+        source_hash = file_hash(database_file)
+        data = None
+        if os.path.exists(self.index_file):
+            data = dict(np.load(self.index_file))
+            if str(data['source_hash']) != source_hash:
+                data = None
+        if data is None:
+            data = self.build(database_file, source_hash)
+            np.savez(self.index_file, **data)
+        self.__dict__.update(data)
+        self.terms = {term: k for k, term in enumerate(self.vocabulary)}
+
+    @staticmethod
+    def build(database_file, source_hash):
+        '''Compiles database .csv file to dictionary of numpy arrays'''
+        import pandas as pd
+        df = pd.read_csv(database_file, sep = ';').dropna()
+        data = {'source_hash': np.array(source_hash)}
+        for column in SchemeIndex.COLUMNS:
+            data[column] = np.array(df[column].astype(str).tolist(), dtype=str)
+        outputs = [sorted(str_to_float_list(x)) for x in df['output_voltage']]
+        n_out = max(len(x) for x in outputs)
+        data['output_number'] = df['output_number'].to_numpy(dtype=int)
+        data['output_values'] = np.array([x+[np.nan]*(n_out-len(x)) for x in outputs])
+        data['input_values'] = df['input_voltage'].to_numpy(dtype=float)
+        documents = [tokenize(x) for x in df['description']]
+        vocabulary = sorted(set(token for tokens in documents for token in tokens))
+        terms = {term: k for k, term in enumerate(vocabulary)}
+        n_docs = len(documents)
+        postings = [[] for _ in vocabulary]
+        for row, tokens in enumerate(documents):
+            for token in set(tokens):
+                postings[terms[token]].append((row, tokens.count(token)))
+        idf = np.log((1+n_docs)/(1+np.array([len(x) for x in postings]))) + 1
+        rows = np.array([row for x in postings for row, _ in x], dtype=np.int32)
+        weights = np.array([count for x in postings for _, count in x], dtype=float)
+        weights *= np.repeat(idf, [len(x) for x in postings])
+        norms = np.sqrt(np.bincount(rows, weights**2, minlength=n_docs))
+        data['vocabulary'] = np.array(vocabulary)
+        data['idf'] = idf
+        data['posting_rows'] = rows
+        data['posting_weights'] = weights/norms[rows]
+        data['posting_start'] = np.concatenate([[0], np.cumsum([len(x) for x in postings])])
+        return data
+
+    def text_scores(self, text):
+        '''Cosine similarity of text and every description TF-IDF vectors, in range [0:100].
+        It replaces fuzzy token sort ratio, so some requests select other circuits than before'''
+        scores = np.zeros(len(self.chip_name))
+        query = [self.terms[token] for token in tokenize(text) if token in self.terms]
+        if not query:
+            return scores
+        terms, counts = np.unique(query, return_counts=True)
+        q = counts*self.idf[terms]
+        q = q/np.sqrt(sum(q**2))
+        for term, weight in zip(terms, q):
+            start, end = self.posting_start[term], self.posting_start[term+1]
+            scores[self.posting_rows[start:end]] += weight*self.posting_weights[start:end]
+        return 100*scores
+
+    def search(self, text, input_voltage, output_voltage, k=5):
+        '''Returns list of k best matching circuits as (score, row dictionary),
+        only circuits with the same outputs number are compared'''
+        desired = np.array(sorted(output_voltage))
+        rows = np.nonzero(self.output_number == len(desired))[0]
+        if len(rows) == 0:
+            return []
+        real_in = np.abs(self.input_values[rows])
+        vin_relevance = (np.minimum(real_in, input_voltage)+1)/(np.maximum(real_in, input_voltage)+1)
+        if input_voltage == 0:
+            vin_relevance[:] = 1
+        real_out = self.output_values[rows][:, :len(desired)]
+        sd = np.sqrt(((real_out - desired)**2).sum(axis=1))
+        max_voltage = np.abs(real_out).max(axis=1)
+        vout_relevance = (max_voltage + 1)/(max_voltage + sd + 1)
+        score = self.text_scores(text)[rows] + vin_relevance*50 + vout_relevance*50
+        best = np.argsort(-score, kind='stable')[:k]
+        return [(score[j], self.row(rows[j])) for j in best]
+
+    def row(self, i):
+        '''Returns circuit database row as dictionary'''
+        row = {column: str(getattr(self, column)[i]) for column in self.COLUMNS}
+        row['input_voltage'] = float(row['input_voltage'])
+        return row
+
+@PROFILER.timed('request parsing')
+def parse_request(request):
+    '''Finds input voltage, output voltages and AC source in request text. Returns request text
+    without found voltages, input voltage, output voltages list and (amplitude, frequency) tuple'''
     input_voltage = '0'
     output_voltage = '0'
     ac_source = False
@@ -331,13 +1770,14 @@ def get_best_scheme_match(request, database_file = 'Power_supply_data.csv'):
     else:
         ac_input = (None, None)
     output_voltage = [float(x) for x in output_voltage]
-    df = pd.read_csv(database_file, sep = ';').dropna()
-    df = df[df['output_number']==len(output_voltage)]
-    df['token_set_ratio'] = df['description'].map(lambda x: fuzz.token_sort_ratio(request, x))
-    df['vin_relevance'] = df['input_voltage'].map(lambda x: input_relevance(input_voltage, x))
-    df['vout_relevance'] = df['output_voltage'].map(lambda x: output_relevance(output_voltage, x))
-    df['total_match_score'] = df['token_set_ratio'] + df['vin_relevance']*50 + df['vout_relevance']*50
-    best_match = df.loc[df['total_match_score'].idxmax()]
+    return request, input_voltage, output_voltage, ac_input
+
+def get_best_scheme_match(request, database_file = 'Power_supply_data.csv', index=None):
+    '''Finds circuit from database_file, that "best matches" request text'''
+    request, input_voltage, output_voltage, ac_input = parse_request(request)
+    index = index or SchemeIndex(database_file)
+    with PROFILER.span('catalog matching'):
+        _, best_match = index.search(request, input_voltage, output_voltage, k=1)[0]
     if input_voltage == 0:
         input_voltage = best_match['input_voltage']  
     print('AC input: {}'.format(ac_input))
@@ -345,87 +1785,94 @@ def get_best_scheme_match(request, database_file = 'Power_supply_data.csv'):
     print('Output voltage: {}'.format(output_voltage))
     return best_match, input_voltage, output_voltage, ac_input
 
-def write_component_additional_features(filename):
+def derating_components(schematic, netlist_nodes):
+    '''Finds derated components of Schematic: resistors (except Rload), capacitors and inductors.
+    netlist_nodes is node map from get_netlist_nodes. Returns {component name: (symbol type,
+    trace names)}: current trace for resistors and inductors, node voltages for capacitors
+    ('0' for ground)'''
+    components = {}
+    for symbol in schematic.symbols():
+        name = symbol.name
+        if name == '' or symbol.get('Value') is None:
+            continue
+        if (symbol.type == 'res' and name != 'Rload') or symbol.type in ['ind', 'ind2']:
+            components[name] = (symbol.type, ['i('+name.lower()+')'])
+        elif symbol.type == 'cap' and get_capacitor_nodes(netlist_nodes, name):
+            components[name] = (symbol.type, ['v('+x.lower()+')' if x != '0' else '0'
+                                              for x in get_capacitor_nodes(netlist_nodes, name)])
+    return components
+
+def derating_traces(components):
+    '''Lists traces, needed for derating of components from derating_components'''
+    return sorted({x for _, traces in components.values() for x in traces if x != '0'})
+
+def derating_values(schematic, components, traces, matrix):
+    '''Calculates resistor thermal power, capacitor maximum voltage and inductor maximum current
+    for all components at once. matrix rows are traces values. Returns {component name: SpiceLine}'''
+    rows = {x: k for k, x in enumerate(traces)}
+    rows['0'] = len(traces)
+    matrix = np.vstack([matrix, np.zeros((1, matrix.shape[1])), np.full((1, matrix.shape[1]), np.nan)])
+    def index(kind, n_traces=1):
+        names = [x for x, (symbol_type, _) in components.items() if symbol_type in kind]
+        return names, np.array([[rows.get(x, len(traces)+1) for x in components[name][1]] for name in names],
+                               dtype=int).reshape(len(names), n_traces)
+    lines = {}
+    names, idx = index(['res'])
+    values = np.array([exp_to_number(schematic.components[x].get('Value').split()[0]) for x in names])
+    for name, power in zip(names, values*(matrix[idx[:, 0]]**2).max(axis=1)):
+        if np.isfinite(power):
+            lines[name] = 'pwr='+str(number_to_nominal(power, R_POWER_RAW))+' tol=2'
+    names, idx = index(['cap'], 2)
+    for name, voltage in zip(names, np.abs(matrix[idx[:, 0]]-matrix[idx[:, 1]]).max(axis=1)):
+        if np.isfinite(voltage):
+            lines[name] = 'V='+str(number_to_nominal(voltage, C_VOLTAGE_RAW))
+    names, idx = index(['ind', 'ind2'])
+    for name, current in zip(names, np.abs(matrix[idx[:, 0]]).max(axis=1)):
+        if np.isfinite(current):
+            lines[name] = 'Ipk='+str(round(current, 3))
+    return lines
+
+def write_component_additional_features(filename, simulator=None, netlist_nodes=None, kept=None, sample=None):
     '''Writes resistor thermal power, capacitor maximum voltage
-    and inductance maximum current to LTSpice .asc file
+    and inductance maximum current to LTSpice .asc file.
+    netlist_nodes is node map from get_netlist_nodes (netlist of filename is created if None),
+    kept is BestTraces of optimization, circuit is simulated only if it has no traces of sample.
     Initial file would be overwritten'''
-    last_component_name = None
-    component_type = None
-    LTC = SimCommander(filename)
-    LTC.set_parameters()
-    LTC.run()
-    LTC.wait_completion()
-    rewrited_netlist = []
-    netlist_file = open(filename, 'r')
-    netlist = netlist_file.readlines()
-    netlist_file.close()
-    LTR = LTSpiceRawRead('.'.join(filename.split('.')[0:-1])+'_1.raw')
-    for i in range(len(netlist)):
-        line = netlist[i]
-        if not('SYMATTR SpiceLine' in line):
-            rewrited_netlist.append(line)
-        line = line.split()
-        if line[0] == 'SYMBOL':
-            component_type = line[1]
-            last_component_name = ''
-        if line[0] == 'SYMATTR' and line[1] == 'InstName':
-            last_component_name = line[2]
-        if (line[0] == 'SYMATTR') and (line[1] == 'Value'):
-            if last_component_name != '':
-                if (component_type == 'res') and (last_component_name != 'Rload'):
-                    res_current = max(LTR.get_trace('I('+last_component_name+')'))
-                    res_value = exp_to_number(line[2])
-                    arr = np.array(LTR.get_trace('I('+last_component_name+')')[:])
-                    res_power = res_value * max(arr*arr)
-                    res_power = str(number_to_nominal(res_power, R_POWER_RAW))
-                    rewrited_netlist.append('SYMATTR SpiceLine pwr='+res_power+' tol=2\n')
-                    last_component_name = ''
-                if (component_type == 'cap'):
-                    node1, node2 = get_capacitor_nodes(filename, last_component_name)
-                    v1 = np.array(LTR.get_trace('V('+node1+')')[:]) if node1!='0' else 0
-                    v2 = np.array(LTR.get_trace('V('+node2+')')[:]) if node2!='0' else 0
-                    cap_voltage = max(abs(v1-v2))
-                    cap_voltage = str(number_to_nominal(cap_voltage, C_VOLTAGE_RAW))
-                    rewrited_netlist.append('SYMATTR SpiceLine V='+cap_voltage+'\n')
-                    last_component_name = ''
-                if (component_type in ['ind', 'ind2']):
-                    l_current = np.array(LTR.get_trace('I('+last_component_name+')')[:])
-                    peak_current = str(round(max(abs(l_current)),3))
-                    rewrited_netlist.append('SYMATTR SpiceLine Ipk='+peak_current+'\n')
-                    last_component_name = ''
-    file = open(filename, 'w+')
-    file.writelines(rewrited_netlist)
-    file.close()           
+    simulator = simulator or LTSpiceSimulator()
+    if netlist_nodes is None:
+        netlist_nodes = get_netlist_nodes(simulator.netlist(filename))
+    schematic = Schematic(filename)
+    components = derating_components(schematic, netlist_nodes)
+    traces = derating_traces(components)
+    matrix = kept.get(sample) if kept and sample is not None and kept.traces == traces else None
+    if not traces:
+        matrix = np.zeros((0, 1))
+    elif matrix is None:
+        print('Derating: circuit is simulated')
+        keep = BestTraces(traces, [])
+        simulator.final_values(filename, {0: {}}, [], keep)
+        matrix = keep.get({})
+    lines = derating_values(schematic, components, traces, matrix)
+    for symbol in schematic.symbols():
+        symbol.remove('SpiceLine')
+        if symbol.name in lines:
+            symbol.set('SpiceLine', lines[symbol.name])
+    schematic.write(filename)
     return
 
-def get_workspace_frame(netlist_text):
-    '''Finds min and max netlist component coordinates'''
-    min_x, min_y, max_x, max_y =  10000, 10000, -10000, -10000
-    for line in netlist_text:
-        line = line.split()
-        if line[0] == 'SYMBOL':
-            x = int(line[2])
-            y = int(line[3])
-            min_x, max_x = min(min_x, x), max(max_x, x)
-            min_y, max_y = min(min_y, y), max(max_y, y)
-        if line[0] == 'WIRE':
-            x1 = int(line[1])
-            y1 = int(line[2])
-            x2 = int(line[3])
-            y2 = int(line[4])            
-            min_x, max_x = min(min_x, x1, x2), max(max_x, x1, x2)
-            min_y, max_y = min(min_y, y1, y2), max(max_y, y1, y2)           
-    return min_x, min_y, max_x, max_y
-
-def add_circuit_module(source_text, destination_text,
+def get_workspace_frame(schematic):
+    '''Finds min and max schematic component coordinates'''
+    return schematic.frame()
+
+def add_circuit_module(source, destination,
                        old_node_name = 'IN',
                        new_node_name = 'IN',
                        ac_source = (None, None),
                        source_rename = '_1', alignment = 'LEFT'):
-    '''Appends circuit netlist to other circuit netlist,
+    '''Appends source Schematic components to destination Schematic (in place),
     Connection would be performed by nodes'''
-    min_dx, min_dy, max_dx, max_dy = get_workspace_frame(destination_text)
-    min_sx, min_sy, max_sx, max_sy = get_workspace_frame(source_text)
+    min_dx, min_dy, max_dx, max_dy = get_workspace_frame(destination)
+    min_sx, min_sy, max_sx, max_sy = get_workspace_frame(source)
     ac_voltage, ac_frequency = ac_source
     DELTA = 128  # space between circuits in LTSpice 
     if alignment == 'LEFT':
@@ -437,85 +1884,226 @@ def add_circuit_module(source_text, destination_text,
     else:
         dx = 0
         dy = 0
-    output_lines = []
-    for i in range(len(source_text)):
-        line = source_text[i].split()
-        if line[0] == 'SYMBOL':
-            x1 = int(line[2])
-            y1 = int(line[3])
-            source_text[i] = 'SYMBOL {} {} {} {}\n'.format(line[1], x1+dx, y1+dy, line[4])
-        if line[0] == 'WIRE':
-            x1 = int(line[1])
-            y1 = int(line[2])
-            x2 = int(line[3])
-            y2 = int(line[4])
-            source_text[i] = 'WIRE {} {} {} {}\n'.format(x1+dx, y1+dy, x2+dx, y2+dy)
-        if line[0] == 'FLAG':
-            if line[3] == old_node_name:
-                line[3] = new_node_name
-            x1 = int(line[1])
-            y1 = int(line[2])
-            source_text[i] = 'FLAG {} {} {}\n'.format(x1+dx, y1+dy, line[3])
-        if line[0] == 'SYMATTR' and line[1] == 'InstName':
-            source_text[i] = 'SYMATTR InstName {}_1\n'.format(line[2])
-        if ac_voltage and source_text[i] == 'SYMATTR Value SINE(0 310 50)\n':
-                source_text[i] = 'SYMATTR Value SINE(0 {} {})'.format(ac_voltage, ac_frequency)
-        if not line[0] in ['Version', 'SHEET', 'TEXT']:
-            output_lines.append(source_text[i])
+    for item in source.copy().items:
+        if isinstance(item, Symbol):
+            item.x, item.y = item.x+dx, item.y+dy
+            item.set('InstName', item.name+source_rename)
+            if ac_voltage and item.get('Value') == 'SINE(0 310 50)':
+                item.set('Value', 'SINE(0 {} {})'.format(ac_voltage, ac_frequency))
+        elif isinstance(item, list) and item[0] == 'WIRE':
+            item[1:] = [item[1]+dx, item[2]+dy, item[3]+dx, item[4]+dy]
+        elif isinstance(item, list) and item[0] == 'FLAG':
+            item[1:] = [item[1]+dx, item[2]+dy, new_node_name if item[3] == old_node_name else item[3]]
+        elif item.split()[0] in ['Version', 'SHEET', 'TEXT']:
+            continue
+        destination.items.append(item)
     if ac_frequency:       #replacing simulation time in destination circuit with one AC period
-        for i in range(len(destination_text)):
-            line = destination_text[i].split()
-            if line[0] == 'TEXT' and line[-1]=='startup':
-                line[-2] = str(round(1000/ac_frequency))+'m' 
-                destination_text[i] = ' '.join(line)+'\n'
-    return destination_text + output_lines
-
-def delete_components(text_lines, component_names = None):
-    '''Delete components from netlist text by list of component names'''
-    output_text = ''
+        set_ac_period_time(destination, ac_frequency)
+    destination.reindex()
+    return destination
+
+def set_ac_period_time(schematic, ac_frequency):
+    '''Sets .tran startup simulation time of Schematic (in place) to one AC period'''
+    for i, item in enumerate(schematic.items):
+        line = item.split() if isinstance(item, str) else []
+        if line and line[0] == 'TEXT' and line[-1]=='startup':
+            line[-2] = str(round(1000/ac_frequency))+'m'
+            schematic.items[i] = ' '.join(line)
+    return schematic
+
+def delete_components(schematic, component_names = None):
+    '''Delete components from Schematic (in place) by list of (component name, symbol type)'''
     if component_names:
-        component_start = [i for i, x in enumerate(text_lines) if 'SYMBOL' in x]
-        component_end = component_start+ [len(text_lines)]
-        component_start = [0] + component_start
-        component_lines = tuple(zip(component_start, component_end))
-        for component in component_lines:
-            component_text = ''.join(text_lines[component[0] : component[1]])
-            for component_name, component_type in component_names:
-                pattern = r'SYMBOL '+component_type +'[\S\s]+?\nSYMATTR InstName '\
-                + component_name+'\nSYMATTR Value \S*\n'
-                component_text = re.sub(pattern,'', component_text)    
-            output_text = output_text + component_text
-    return output_text.splitlines(True)
+        schematic.delete(component_names)
+    return schematic
 
 def combine_input_circuit(input_file, body_file, ac_source):
-    '''Rewrites body file with adding netlist from input file'''
-    source_file = os.path.join('rectifiers', input_file)
-    input_voltage_name, node_name = get_voltage_source(body_file)
-    file = open(body_file, 'r')
-    destination_text = file.readlines()
-    file.close()
-    file = open(source_file, 'r')
-    source_text = file.readlines()
-    file.close()
-    destination_text = delete_components(destination_text,
-                                         [(input_voltage_name, 'voltage'),
-                                          (input_voltage_name, 'VOLTAGE')])
-    destination_text = add_circuit_module(source_text, destination_text,
-                                          old_node_name = 'IN', new_node_name = node_name,
-                                          ac_source = ac_source)
-    file = open(body_file, 'w')
-    file.writelines(destination_text)
-    file.close()
-    return
+    '''Adds input circuit from rectifiers folder to body Schematic (in place)
+    or rewrites body .asc file'''
+    source = cached_schematic(os.path.join('rectifiers', input_file))
+    destination = as_schematic(body_file)
+    input_voltage_name, node_name = get_voltage_source(destination)
+    delete_components(destination, [(input_voltage_name, 'voltage'),
+                                    (input_voltage_name, 'VOLTAGE')])
+    add_circuit_module(source, destination,
+                       old_node_name = 'IN', new_node_name = node_name,
+                       ac_source = ac_source)
+    if not destination is body_file:
+        destination.write(body_file)
+    return destination
+
+def scratch_directory(path=None):
+    '''Returns directory for job workspaces: path if defined, else /dev/shm (tmpfs, simulation
+    files don't touch disk) if it is writable, else system temporary directory'''
+    if path:
+        os.makedirs(path, exist_ok=True)
+        return path
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+@contextlib.contextmanager
+def job_workspace(scratch=None, prefix='job_'):
+    '''Creates unique job directory in scratch directory, removes it with all files on exit'''
+    workspace = tempfile.mkdtemp(prefix=prefix, dir=scratch_directory(scratch))
+    try:
+        yield workspace
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+def promote_outputs(files, results_dir='.', prefix=''):
+    '''Moves files to results_dir adding prefix to file names, returns new file names'''
+    os.makedirs(results_dir, exist_ok=True)
+    promoted = []
+    for file in files:
+        promoted.append(os.path.join(results_dir, prefix + os.path.basename(file)))
+        shutil.move(file, promoted[-1])
+    return promoted
+
+#Rectifier circuits in rectifiers folder and their ripple frequency to AC frequency ratio
+RECTIFIERS = {'full_wave': 2, 'half_wave': 1, 'double_voltage': 1, 'multiplier': 1}
+
+def input_current(filename, simulator):
+    '''Estimates DC circuit input current as mean input voltage source current in the second half
+    of simulation time'''
+    name, _ = get_voltage_source(filename)
+    trace = 'I({})'.format(name)
+    current = np.abs(simulator.simulate(filename, {0: {}}, [trace])[0][trace.lower()])
+    return float(current[len(current)//2:].mean())
+
+def rectifier_bus_voltage(rectifier, ac_source, dc_circuit, input_voltage, simulator, cache=None, points=200):
+    '''Simulates rectifier from rectifiers folder with load resistance during one AC period, returns
+    time and output (IN node) voltage arrays with points values. Load is estimated from input_voltage
+    and input current of DC circuit .asc file. Load is cached in FitnessCache for DC circuit and simulator,
+    rectifier output - for rectifier file, AC source, load and simulator'''
+    amplitude, frequency = ac_source
+    load_key = FitnessCache.key(('load', file_hash(dc_circuit), type(simulator).__name__), (), ())
+    cached = cache.get(load_key) if cache is not None else None
+    if cached:
+        load = cached[0]
+    else:
+        load = number_to_raw_value(input_voltage/max(input_current(dc_circuit, simulator), 1e-6), E6_RAW)
+        if cache is not None:
+            cache.put(load_key, [load])
+    source_file = os.path.join('rectifiers', rectifier+'.asc')
+    key = FitnessCache.key(('rectifier', file_hash(source_file), amplitude, frequency, load,
+                            type(simulator).__name__, points), (), ())
+    cached = cache.get(key) if cache is not None else None
+    if cached:
+        return np.array(cached[:points]), np.array(cached[points:])
+    schematic = Schematic(source_file)
+    for symbol in schematic.symbols():
+        if symbol.get('Value') == 'SINE(0 310 50)':
+            symbol.set('Value', 'SINE(0 {} {})'.format(amplitude, frequency))
+    x, y = [flag[1:3] for flag in schematic.flags() if flag[3] == 'IN'][0]
+    load_symbol = Symbol('res', x-16, y-16, 'R0')  #first pin is on IN flag
+    load_symbol.set('InstName', 'Rload')
+    load_symbol.set('Value', number_to_exp(load))
+    schematic.items += [load_symbol, ['FLAG', x, y+80, '0'],
+                        'TEXT {} {} Left 2 !.tran 0 {}m 0 startup'.format(x, y+128, round(1000/frequency))]
+    schematic.reindex()
+    start = time.time()
+    with job_workspace(prefix='rectifier_') as workspace:
+        test_file = os.path.join(workspace, rectifier+'.asc')
+        schematic.write(test_file)
+        result = simulator.simulate(test_file, {0: {}}, ['time', 'V(IN)'])[0]
+    print('Rectifier {} characterization: {:.2f}s'.format(rectifier, time.time()-start))
+    t = np.abs(result['time'])
+    grid = np.linspace(0, t[-1], points)
+    voltage = np.interp(grid, t, result['v(in)'])
+    if cache is not None:
+        cache.put(key, list(grid) + list(voltage))
+    return grid, voltage
+
+def substitute_rectifier(schematic, rectifier, ac_source, time_values, voltage, equivalent='pwl'):
+    '''Replaces input voltage source value of DC circuit Schematic (in place) by rectifier output
+    equivalent: 'pwl' - piecewise linear rectifier output voltage, 'ripple' - DC voltage with sine
+    ripple, found in the second half of AC period. Simulation time is set to one AC period'''
+    name, _ = get_voltage_source(schematic)
+    if equivalent == 'pwl':
+        value = 'PWL(' + ' '.join('{:.6g} {:.6g}'.format(t, v) for t, v in zip(time_values, voltage)) + ')'
+    else:
+        tail = voltage[len(voltage)//2:]
+        value = 'SINE({:.6g} {:.6g} {:.6g})'.format((tail.max()+tail.min())/2, (tail.max()-tail.min())/2,
+                                                   RECTIFIERS[rectifier]*ac_source[1])
+    schematic.components[name].set('Value', value)
+    return set_ac_period_time(schematic, ac_source[1])
 
-def generate_scheme_by_request(request, n_generations=6, n_samples=20, sel=0.2):
-    '''Selects scheme from dataset and performs genetic algorithm optimization'''
+class DesignOptions:
+    '''Options of generate_scheme_by_request, grouped by purpose.
+    Evolution: steady=True replaces generations by asynchronous steady-state evolution with the same number of
+    samples, timeout limits its sample simulation time, target is fitness for time to target report,
+    early_stopping is dictionary of EarlyStopping arguments, migrate(Population, generation, statistics) is called
+    after every generation and returns Population with immigrants of island model (see run_island()).
+    Screening: fidelity is (time fraction, promoted fraction) tuple for multi-fidelity simulation, oversample
+    above 1 enables surrogate model pre-screening of oversample times more children, components with
+    sensitivity less than freeze part of the maximum one keep template values.
+    Storage: checkpoint is file name for optimization state, saved after every generation and removed when
+    optimization is finished, resume=True continues optimization from checkpoint, job_name is prefix of
+    working and generated file names, promoted to results_dir from job workspace in scratch directory
+    (see scratch_directory()), reuse=False optimizes request, found in design library, again.
+    AC input: rectifier is input circuit from RECTIFIERS, equivalent ('pwl' or 'ripple') replaces it by
+    precharacterized voltage source during optimization (see substitute_rectifier()).
+    Daemon: progress(event dictionary) is called with selected chip and after every generation with the best
+    fitness and estimated remaining time (ETA) in seconds'''
+    def __init__(self, steady=False, timeout=None, target=None, early_stopping=None, migrate=None,
+                 fidelity=None, oversample=1, freeze=0, checkpoint=None, resume=False, job_name='',
+                 scratch=None, results_dir='.', reuse=True, rectifier='full_wave', equivalent=None, progress=None):
+        self.steady = steady
+        self.timeout = timeout
+        self.target = target
+        self.early_stopping = early_stopping
+        self.migrate = migrate
+        self.fidelity = fidelity
+        self.oversample = oversample
+        self.freeze = freeze
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.job_name = job_name
+        self.scratch = scratch
+        self.results_dir = results_dir
+        self.reuse = reuse
+        self.rectifier = rectifier
+        self.equivalent = equivalent
+        self.progress = progress
+
+    def replace(self, **changes):
+        '''Returns copy of options with changed values'''
+        return DesignOptions(**dict(vars(self), **changes))
+
+def generate_scheme_by_request(request, n_generations=6, n_samples=20, sel=0.2, jobs=1, cache=None,
+                               evaluation='sample', simulator=None, index=None, library=None, seed=None,
+                               options=None):
+    '''Selects scheme from dataset and performs genetic algorithm optimization,
+    jobs defines number of simultaneously running simulations,
+    cache is FitnessCache shared between runs (new in-memory cache is used if None),
+    evaluation is 'sample' (one simulation per sample) or 'step' (.step sweep over samples),
+    simulator is Simulator instance (LTSpiceSimulator with jobs and evaluation is used if None),
+    index is SchemeIndex of circuit database, library is DesignLibrary: finished design is stored there,
+    the same request returns stored design if it was optimized with at least n_generations*n_samples budget
+    or reached target, nearest designs of the same circuit seed initial population.
+    seed initializes random generator, options is DesignOptions (request=None takes request from checkpoint).
+    Returns dictionary with selected chip, achieved output voltages, fitness and generated file name'''
+    options = options or DesignOptions()
     MIN_SD = 0.025 #minimum standard deviation
     MAX_SD = 0.5   #maximum standard deviation
-    scheme, req_vin, req_vout, ac_in = get_best_scheme_match(request)
+    if options.steady and (options.fidelity or options.oversample > 1):
+        raise ValueError('steady-state evolution doesn\'t support fidelity and surrogate screening')
+    rng = np.random.default_rng(seed)
+    state = None
+    if options.resume:
+        saved_pop, state = load_checkpoint(options.checkpoint)
+        if request and request != state['request']:
+            raise ValueError('checkpoint {} is saved for request "{}"'.format(options.checkpoint, state['request']))
+        request = state['request']
+        rng.bit_generator.state = state['rng']
+        print('Resumed from {}: {} generations, {} simulations'.format(options.checkpoint, len(state['history']),
+                                                                      state['simulations']))
+    scheme, req_vin, req_vout, ac_in = get_best_scheme_match(request, index=index)
     print('Selected chip: {}'.format(scheme['chip_name']))
     print(scheme['description'])
-    model = scheme['model_file']
+    if options.progress:
+        options.progress({'event': 'chip', 'chip': scheme['chip_name'], 'description': scheme['description']})
     req_vout = sorted(req_vout)
     scheme_out = str_to_float_list(scheme['output_voltage'])
     node_out = str_to_str_list(scheme['output_node'])
@@ -525,33 +2113,664 @@ def generate_scheme_by_request(request, n_generations=6, n_samples=20, sel=0.2):
     print('Selected chip output voltages: {}'.format(scheme_out))
     print('Selected chip output nodes: {}'.format(node_out))
     dir_path = 'pcb_dataset'
-    scheme_path = os.path.join(dir_path, model)
-    if os.path.isfile(scheme_path):
-        write_intital_voltage(scheme_path, model, req_vin)
-        if ac_in[0]:
-            ac_input_path = 'full_wave.asc'  #the most common rectifier scheme
-            combine_input_circuit(ac_input_path, model, ac_in)  
-        template, component_types = get_netlist_components(model)
-        pop = generate_population(template, component_types, n_samples)
-        sd = (sum((np.array(req_vout)-np.array(scheme_out))**2))**0.5
-        deviation = min(MAX_SD, sd + MIN_SD)
-        for i in range(n_generations):
-            print('Generation: {}'.format(i))
-            pop, best, level = create_new_generation(pop, model, node_out, req_vout, deviation, sel)
-            deviation = level/max(req_vout)+MIN_SD
-            print('Deviation: {}'.format(deviation))
-    gen_name = 'generated_'+scheme['chip_name']+'.asc'
-    write_netlist_components(model, gen_name, best)
-    write_component_additional_features(gen_name)
-    file = scheme['model_file'][:-4]
-    for i in ['.raw', '.op.raw', '.log', '.net']:
-        if os.path.exists(file + i):
-            os.remove(file + i)
-        if os.path.exists(gen_name[:-4] + '_1' + i):
-            os.remove(gen_name[:-4] + '_1' + i)
-    if os.path.exists(gen_name[:-4] + '.net'):
-        os.remove(gen_name[:-4] + '.net')
-    return 
+    scheme_path = os.path.join(dir_path, scheme['model_file'])
+    if cache is None:
+        cache = FitnessCache()
+    if simulator is None:
+        simulator = LTSpiceSimulator(jobs, evaluation)
+    library_context = (file_hash(scheme_path) + (':'+options.rectifier if ac_in[0] else ''),
+                       type(simulator).__name__)
+    design = library.exact(*library_context, req_vin, ac_in, req_vout, n_generations*n_samples, options.target) \
+             if library and options.reuse and not options.resume else None
+    if design:
+        print('Design library: the same request is found, fitness {:.4g} (--refresh optimizes it again)'.format(
+              design['fitness']))
+        os.makedirs(options.results_dir, exist_ok=True)
+        gen_name = os.path.join(options.results_dir, options.job_name + 'generated_'+scheme['chip_name']+'.asc')
+        file = open(gen_name, 'w', encoding=ASC_ENCODING)
+        file.write(design['circuit'])
+        file.close()
+        return {'chip': scheme['chip_name'],
+                'input_voltage': float(req_vin),
+                'target_voltage': req_vout,
+                'achieved_voltage': design['achieved'],
+                'fitness': design['fitness'],
+                'time_to_target': None,
+                'utilization': 0,
+                'library': 'exact',
+                'output': gen_name}
+    with job_workspace(options.scratch, options.job_name or 'job_') as workspace:
+        model = os.path.join(workspace, scheme['model_file'])
+        if os.path.isfile(scheme_path):
+            cache_context = (file_hash(scheme_path), req_vin, ac_in, type(simulator).__name__)
+            schematic = write_intital_voltage(cached_schematic(scheme_path), None, req_vin)
+            full_schematic = None
+            if ac_in[0] and options.equivalent:
+                schematic.write(model)
+                bus = rectifier_bus_voltage(options.rectifier, ac_in, model, req_vin, simulator, cache)
+                full_schematic = combine_input_circuit(options.rectifier+'.asc', schematic.copy(), ac_in)
+                substitute_rectifier(schematic, options.rectifier, ac_in, *bus, options.equivalent)
+                cache_context += (options.rectifier, options.equivalent)
+            elif ac_in[0]:
+                combine_input_circuit(options.rectifier+'.asc', schematic, ac_in)
+                cache_context += (options.rectifier,) if options.rectifier != 'full_wave' else ()
+            schematic.write(model)
+            netlist_nodes = get_netlist_nodes(simulator.netlist(model))
+            keep = BestTraces(derating_traces(derating_components(schematic, netlist_nodes)), req_vout)
+            template, component_types = get_netlist_components(schematic)
+            if options.freeze and template:
+                ranking = sensitivity_ranking(model, template, node_out, simulator, cache, cache_context)
+                template = freeze_components(template, ranking, options.freeze)
+            sd = (sum((np.array(req_vout)-np.array(scheme_out))**2))**0.5
+            neighbours = library.nearest(*library_context, req_vin, req_vout) if library and not state else []
+            if neighbours:
+                print('Design library: {} nearest designs are used as seeds'.format(len(neighbours)))
+                sd = min([sd] + [(sum((np.array(req_vout)-np.array(x['achieved']))**2))**0.5 for x in neighbours])
+            deviation = min(MAX_SD, sd + MIN_SD)
+            if state:
+                if state.get('template') != template or state.get('circuit') != cache_context[0]:
+                    raise ValueError('checkpoint {} doesn\'t match circuit {}'.format(options.checkpoint,
+                                                                                      scheme['model_file']))
+                pop, deviation, best = saved_pop, state['deviation'], state['best']
+            else:
+                pop = generate_population(template, component_types, n_samples, rng,
+                                          [x['components'] for x in neighbours])
+            stopping = EarlyStopping(state=state, **(options.early_stopping or {}))
+            def save(pop, deviation, best, progress):
+                if options.checkpoint:
+                    save_checkpoint(options.checkpoint, pop,
+                                    {'request': request, 'model': scheme['model_file'],
+                                     'circuit': cache_context[0], 'template': template,
+                                     'deviation': deviation, 'best': best, 'progress': progress,
+                                     'history': stopping.history, 'simulations': stopping.simulations,
+                                     'elapsed': stopping.elapsed(), 'rng': rng.bit_generator.state})
+            surrogate = Surrogate(options.oversample) if options.oversample > 1 else None
+            first = state['progress'] if state else 0
+            progress_start = time.time()
+            def report_progress(generation):
+                if options.progress:
+                    eta = (time.time()-progress_start)/max(generation-first, 1e-6)*(n_generations-generation)
+                    options.progress({'event': 'generation', 'generation': generation, 'generations': n_generations,
+                                      'fitness': stopping.history[-1], 'eta': round(max(eta, 0), 1)})
+            if options.steady and options.migrate:
+                raise ValueError('island model requires generational evolution')
+            if options.steady:
+                first = first//n_samples
+                def steady_save(elites, submitted):
+                    save(elites, deviation, elites.sample(0), submitted)
+                    report_progress(submitted/n_samples)
+                best, report = steady_state_evolution(pop, model, node_out, req_vout, deviation, simulator, cache,
+                                                      cache_context, rng, n_generations*n_samples,
+                                                      max(2, int(round(n_samples*sel))), options.timeout,
+                                                      options.target, stopping,
+                                                      steady_save, state['progress'] if state else 0, n_samples,
+                                                      None if full_schematic else keep)
+            else:
+                report = {'time_to_target': None}
+                start = time.time()
+                busy_start = simulator.busy_time
+                for i in range(state['progress'] if state else 0, n_generations):
+                    print('Generation: {}'.format(i))
+                    pop, best, level, stats = create_new_generation(pop, model, node_out, req_vout, deviation, sel,
+                                                                    simulator, cache, cache_context, rng,
+                                                                    options.fidelity, surrogate,
+                                                                    None if full_schematic else keep)
+                    deviation = level/max(req_vout)+MIN_SD
+                    print('Deviation: {}'.format(deviation))
+                    if options.migrate:
+                        pop = options.migrate(pop, i+1, stats)
+                    if options.target is not None and stats['fitness'] <= options.target and \
+                       report['time_to_target'] is None:
+                        report['time_to_target'] = time.time() - start
+                    stopping.update(stats['fitness'], stats['simulated'])
+                    save(pop, deviation, best, i+1)
+                    report_progress(i+1)
+                    reason = stopping.reason()
+                    if reason:
+                        print('Early stopping: {}'.format(reason))
+                        break
+                report['fitness'] = stopping.history[-1]
+                report['utilization'] = (simulator.busy_time-busy_start)/(max(time.time()-start, 1e-6)*simulator.jobs)
+                print_evolution_report(report, options.target)
+            cache.report()
+            if full_schematic:  #verification of the best sample with rectifier co-simulation
+                schematic = full_schematic
+                schematic.write(model)
+                netlist_nodes = get_netlist_nodes(simulator.netlist(model))
+                keep = BestTraces(derating_traces(derating_components(schematic, netlist_nodes)), req_vout)
+                achieved = simulator.final_values(model, {0: best}, node_out, keep)[0]
+                print('Rectifier co-simulation output voltages: {}'.format(achieved))
+            else:
+                achieved = cache.get(cache.key(cache_context + tuple(node_out), list(best.keys()),
+                                               list(best.values())))
+            if achieved is None:
+                achieved = simulator.final_values(model, {0: best}, node_out, keep)[0]
+        gen_name = os.path.join(workspace, 'generated_'+scheme['chip_name']+'.asc')
+        write_netlist_components(schematic, gen_name, best)
+        write_component_additional_features(gen_name, simulator, netlist_nodes, keep, best)
+        model, gen_name = promote_outputs([model, gen_name], options.results_dir, options.job_name)
+        fitness = float((sum((np.array(achieved)-np.array(req_vout))**2))**0.5)
+        if library:
+            file = open(gen_name, 'r', encoding=ASC_ENCODING)
+            library.store({'model': library_context[0], 'simulator': library_context[1],
+                           'chip': scheme['chip_name'], 'input_voltage': req_vin, 'ac': ac_in,
+                           'targets': req_vout, 'components': best, 'achieved': [float(x) for x in achieved],
+                           'fitness': fitness, 'circuit': file.read(), 'budget': n_generations*n_samples})
+            file.close()
+        if options.checkpoint and os.path.isfile(options.checkpoint):
+            os.remove(options.checkpoint)
+        return {'chip': scheme['chip_name'],
+                'input_voltage': float(req_vin),
+                'target_voltage': req_vout,
+                'achieved_voltage': [float(x) for x in achieved],
+                'fitness': fitness,
+                'time_to_target': report['time_to_target'],
+                'utilization': report['utilization'],
+                'library': 'seeded' if neighbours else None,
+                'output': gen_name}
+
+def run_batch(batch_file, output_file, concurrency=2, simulator=None, cache=None, index=None, library=None,
+              options=None):
+    '''Performs generate_scheme_by_request for every line of .jsonl batch_file with request
+    parameters "text", "gen", "pop", "sel" and optional "seed" and "target". Up to concurrency requests are
+    running at the same time, sharing simulator, cache, index, design library and DesignOptions.
+    Files of every request have jobN_ prefix, checkpoint option enables optimization state of every request,
+    saved to jobN_ prefixed file in the same directory. Result of every finished request is written to
+    output_file as json line, failed request doesn't stop the batch'''
+    simulator = simulator or LTSpiceSimulator()
+    cache = cache or FitnessCache()
+    index = index or SchemeIndex()
+    options = options or DesignOptions()
+    file = open(batch_file, 'r')
+    requests = [json.loads(line) for line in file if line.strip()]
+    file.close()
+    output = open(output_file, 'w')
+    lock = threading.Lock()
+    def process(n, params):
+        start = time.time()
+        result = {'line': n+1, 'request': params.get('text')}
+        try:
+            job_name = 'job{}_'.format(n+1)
+            checkpoint = options.checkpoint and os.path.join(os.path.dirname(options.checkpoint),
+                                                             job_name+os.path.basename(options.checkpoint))
+            result.update(generate_scheme_by_request(params['text'],
+                                                     params.get('gen', 6),
+                                                     params.get('pop', 20),
+                                                     params.get('sel', 0.2),
+                                                     cache=cache, simulator=simulator, index=index,
+                                                     library=library, seed=params.get('seed'),
+                                                     options=options.replace(job_name=job_name,
+                                                                             checkpoint=checkpoint,
+                                                                             target=params.get('target',
+                                                                                               options.target))))
+        except Exception as e:
+            result['error'] = '{}: {}'.format(type(e).__name__, e)
+        result['wall_time'] = round(time.time() - start, 3)
+        with lock:
+            output.write(json.dumps(result)+'\n')
+            output.flush()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for n, params in enumerate(requests):
+            pool.submit(process, n, params)
+    output.close()
+    print('Batch results: {}'.format(output_file))
+    return
+
+DAEMON_PORT = 8765
+SERVER_PARAMETERS = ['sim', 'eval', 'cache', 'library']
+
+class FairQueue:
+    '''Design requests queue, served round robin by client, so client with many queued requests
+    doesn't delay requests of other clients'''
+    def __init__(self):
+        self.queues = OrderedDict()  #client: list of jobs, the next served client is the first
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        with self.condition:
+            return sum(len(x) for x in self.queues.values())
+
+    def put(self, client, job):
+        '''Queues job of client, returns its position in serving order, starting from 1'''
+        with self.condition:
+            self.queues.setdefault(client, []).append(job)
+            self.condition.notify()
+            return self.position(client, len(self.queues[client])-1)
+
+    def position(self, client, k):
+        '''Position of k-th job of client in round robin serving order: all clients are served k times
+        before it (or fewer if they have fewer jobs), then clients before it in the round'''
+        with self.condition:
+            clients = list(self.queues.keys())
+            before = clients[:clients.index(client)]
+            return 1 + sum(min(len(x), k) for x in self.queues.values()) + \
+                   sum(len(self.queues[x]) > k for x in before)
+
+    def get(self):
+        '''Waits for request and returns the first job of the next client'''
+        with self.condition:
+            while not self.queues:
+                self.condition.wait()
+            client, jobs = self.queues.popitem(last=False)
+            job = jobs.pop(0)
+            if jobs:
+                self.queues[client] = jobs
+            return job
+
+class DesignJob:
+    '''Design request parameters and queue of its progress events, name is unique prefix of its files'''
+    def __init__(self, params, client, name=''):
+        self.params = params
+        self.client = client
+        self.name = name
+        self.events = queue.Queue()
+        self.cancelled = False
+
+class DesignService:
+    '''Long running design service. Catalog index, simulation cache, design library, parsed schematics
+    and simulator workers pool are kept in memory between requests. Requests are taken from FairQueue
+    by concurrency threads, config is server parameters dictionary (see server_config()).
+    Request results, checkpoint and scratch paths should be inside root directory (current one if None)'''
+    PATHS = ['results', 'checkpoint', 'scratch']
+
+    def __init__(self, simulator, cache, index=None, library=None, concurrency=2, config=None, root=None):
+        self.simulator = simulator
+        self.cache = cache
+        self.index = index or SchemeIndex()
+        self.library = library
+        self.config = config or {}
+        self.root = os.path.realpath(root or '.')
+        self.queue = FairQueue()
+        self.defaults = vars(argument_parser().parse_args([]))
+        self.counts = {'running': 0, 'finished': 0, 'failed': 0}
+        self.submitted = 0
+        self.lock = threading.Lock()
+        self.started = time.time()
+        for _ in range(concurrency):
+            threading.Thread(target=self.worker, daemon=True).start()
+
+    def submit(self, params, client):
+        '''Queues request with CLI parameters (missing ones have CLI default values), returns DesignJob.
+        Raises ValueError if request file path is outside root directory'''
+        params = dict(self.defaults, **params)
+        for key in self.PATHS:
+            if params.get(key):
+                params[key] = os.path.realpath(os.path.join(self.root, params[key]))
+                if os.path.commonpath([params[key], self.root]) != self.root:
+                    raise ValueError('{} {} is outside daemon directory {}, use --no-daemon'.format(
+                                     key, params[key], self.root))
+        with self.lock:
+            self.submitted += 1
+            name = '{}_{}_'.format(re.sub(r'\W', '_', str(client)), self.submitted)
+        job = DesignJob(params, client, name)
+        with self.queue.condition:  #queued event goes before started one
+            job.events.put({'event': 'queued', 'position': self.queue.put(client, job)})
+        return job
+
+    def status(self):
+        with self.lock:
+            return dict(self.counts, queued=len(self.queue), pid=os.getpid(), config=self.config,
+                        uptime=round(time.time()-self.started, 1))
+
+    def worker(self):
+        while True:
+            job = self.queue.get()
+            if job.cancelled:
+                continue
+            with self.lock:
+                self.counts['running'] += 1
+            job.events.put({'event': 'started'})
+            def progress(event):
+                if job.cancelled:
+                    raise RuntimeError('request is cancelled by client')
+                job.events.put(event)
+            try:
+                arguments = design_arguments(job.params)
+                arguments['options'] = arguments['options'].replace(progress=progress, job_name=job.name)
+                result = generate_scheme_by_request(**arguments, cache=self.cache, simulator=self.simulator,
+                                                    index=self.index, library=self.library)
+                job.events.put({'event': 'result', 'result': result})
+                outcome = 'finished'
+            except Exception as e:
+                job.events.put({'event': 'error', 'error': '{}: {}'.format(type(e).__name__, e)})
+                outcome = 'failed'
+            with self.lock:
+                self.counts['running'] -= 1
+                self.counts[outcome] += 1
+
+def serve(service, port=DAEMON_PORT):
+    '''Runs localhost HTTP server of DesignService. GET /status returns service status,
+    POST /design with json CLI parameters (and optional "client" name for fair queueing) streams
+    progress events as json lines up to "result" or "error" event'''
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            return
+
+        def send_events(self, events):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            for event in events:
+                self.wfile.write((json.dumps(event)+'\n').encode())
+                self.wfile.flush()
+
+        def do_GET(self):
+            if self.path == '/status':
+                self.send_events([service.status()])
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            if self.path != '/design':
+                self.send_error(404)
+                return
+            params = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or '{}')
+            try:
+                job = service.submit(params, params.pop('client', self.client_address[0]))
+            except ValueError as e:
+                self.send_events([{'event': 'error', 'error': '{}: {}'.format(type(e).__name__, e)}])
+                return
+            print('Request from {}: {}'.format(job.client, job.params['req']))
+            def events():
+                while True:
+                    event = job.events.get()
+                    yield event
+                    if event['event'] in ['result', 'error']:
+                        return
+            try:
+                self.send_events(events())
+            except OSError:
+                job.cancelled = True
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    print('Design daemon is listening on 127.0.0.1:{}'.format(port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+def server_config(params):
+    '''Selects parameters of CLI parameters dictionary, which are fixed for daemon, file names are absolute'''
+    config = {key: params[key] for key in SERVER_PARAMETERS}
+    for key in ['cache', 'library']:
+        config[key] = os.path.abspath(config[key]) if config[key] else ''
+    return config
+
+def daemon_status(port=DAEMON_PORT, timeout=0.5):
+    '''Returns status dictionary of design daemon, None if it isn't running'''
+    import http.client
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+        connection.request('GET', '/status')
+        status = json.loads(connection.getresponse().read())
+        connection.close()
+        return status
+    except (OSError, ValueError):
+        return None
+
+def print_event(event):
+    '''Prints design daemon progress event'''
+    if event['event'] == 'queued':
+        print('Queued by design daemon, position {}'.format(event['position']))
+    elif event['event'] == 'started':
+        print('Started')
+    elif event['event'] == 'chip':
+        print('Selected chip: {}'.format(event['chip']))
+        print(event['description'])
+    elif event['event'] == 'generation':
+        print('Generation {:.0f}/{}: best fitness {:.4g}, ETA {:.0f}s'.format(event['generation'],
+              event['generations'], event['fitness'], event['eta']))
+    elif event['event'] == 'result':
+        print('Achieved output voltages: {}, fitness {:.4g}'.format(event['result']['achieved_voltage'],
+                                                                    event['result']['fitness']))
+        print('Generated circuit: {}'.format(event['result']['output']))
+    elif event['event'] == 'error':
+        print('Request failed: {}'.format(event['error']))
+
+def request_daemon(params, port=DAEMON_PORT, client=None):
+    '''Sends request with CLI parameters to design daemon, prints its progress events.
+    Relative file names are resolved in current directory. Returns result dictionary'''
+    import http.client
+    params = dict(params, client=client or getpass.getuser())
+    for key in ['results', 'checkpoint', 'scratch']:
+        params[key] = os.path.abspath(params[key]) if params.get(key) else params.get(key)
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    connection.request('POST', '/design', json.dumps(params), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    result = None
+    for line in response:
+        event = json.loads(line)
+        print_event(event)
+        if event['event'] == 'result':
+            result = event['result']
+        elif event['event'] == 'error':
+            connection.close()
+            raise RuntimeError(event['error'])
+    connection.close()
+    return result
+
+TOPOLOGIES = ['ring', 'full', 'star', 'random']
+
+def migration_sources(topology, n_islands, rng=None):
+    '''Returns {island: list of islands, sending migrants to it} for migration topology:
+    'ring' - from the previous island, 'full' - from all other islands, 'star' - from island 0
+    to other islands and from them to island 0, 'random' - from random other island'''
+    islands = range(n_islands)
+    if n_islands < 2:
+        return {k: [] for k in islands}
+    if topology == 'ring':
+        return {k: [(k-1) % n_islands] for k in islands}
+    if topology == 'full':
+        return {k: [j for j in islands if j != k] for k in islands}
+    if topology == 'star':
+        return {k: [0] if k else list(range(1, n_islands)) for k in islands}
+    rng = rng or np.random.default_rng()
+    return {k: [(k + int(rng.integers(1, n_islands))) % n_islands] for k in islands}
+
+def send_message(file, message):
+    '''Writes json line message to socket file'''
+    file.write(json.dumps(message)+'\n')
+    file.flush()
+
+def receive_message(file):
+    '''Reads json line message from socket file, None if connection is closed'''
+    line = file.readline()
+    return json.loads(line) if line else None
+
+def run_island(connection, simulator, cache, index=None, library=None):
+    '''Runs island of island model genetic algorithm for coordinator connection. "run" message
+    contains island number, CLI parameters, migration interval and number of migrants. Every interval
+    generations the best selected samples are sent to coordinator as "migrants" message and "immigrants"
+    from other islands replace the last children. Finally "result" message with result dictionary,
+    generated circuit text and convergence statistics (or "error" message) is sent'''
+    file = connection.makefile('rw', encoding='utf-8', newline='\n')
+    message = receive_message(file)
+    params, interval, n_migrants = message['params'], message['interval'], message['migrants']
+    island = message['island']
+    history = {'fitness': [], 'simulations': 0, 'immigrants': 0}
+    start = time.time()
+    def migrate(pop, generation, stats):
+        history['fitness'].append(stats['fitness'])
+        history['simulations'] += stats['simulated']
+        print('Island {}: generation {}, best fitness {:.4g}'.format(island, generation, stats['fitness']))
+        if generation % interval or generation >= params['gen']:
+            return pop
+        rows = np.argsort(stats['selected'])[:n_migrants]
+        send_message(file, {'type': 'migrants', 'generation': generation, 'names': pop.names,
+                            'values': pop.values[rows].tolist(),
+                            'fitness': [stats['selected'][k] for k in rows]})
+        immigrants = receive_message(file)['values']
+        n = min(len(immigrants), len(pop)-len(stats['selected']))
+        if not n:
+            return pop
+        values = pop.values.copy()
+        values[len(values)-n:] = immigrants[:n]
+        history['immigrants'] += n
+        return Population(pop.names, pop.codes, values)
+    try:
+        with job_workspace(params['scratch'] or None, 'island_') as results_dir:
+            arguments = design_arguments(params)
+            arguments['options'] = arguments['options'].replace(results_dir=results_dir, checkpoint=None,
+                                                                resume=False, migrate=migrate)
+            result = generate_scheme_by_request(**arguments, cache=cache, simulator=simulator, index=index,
+                                                library=library)
+            circuit_file = open(result['output'], 'r', encoding=ASC_ENCODING)
+            circuit = circuit_file.read()
+            circuit_file.close()
+        history['time'] = round(time.time()-start, 3)
+        send_message(file, {'type': 'result', 'result': result, 'circuit': circuit, 'history': history})
+    except Exception as e:
+        send_message(file, {'type': 'error', 'error': '{}: {}'.format(type(e).__name__, e), 'history': history})
+    finally:
+        file.close()
+        connection.close()
+
+def serve_islands(simulator, cache, index=None, library=None, port=DAEMON_PORT, host='127.0.0.1'):
+    '''Runs island model worker: every coordinator connection on TCP host:port runs island in its own
+    thread, islands of the same worker share simulator workers pool'''
+    index = index or SchemeIndex()
+    server = socket.create_server((host, port))
+    print('Island worker is listening on {}:{}'.format(host, server.getsockname()[1]))
+    try:
+        while True:
+            connection, address = server.accept()
+            print('Island run from {}:{}'.format(*address))
+            threading.Thread(target=run_island, args=(connection, simulator, cache, index, library),
+                             daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    server.close()
+
+def island_worker_address(process):
+    '''Waits for local island worker, started with --port 0, to report its port, returns host:port address.
+    Worker output is forwarded to stdout'''
+    for line in process.stdout:
+        found = re.match(r'Island worker is listening on \S+:(\d+)', line)
+        if found:
+            break
+        print(line, end='')
+    else:
+        raise RuntimeError('island worker exited with code {}'.format(process.wait()))
+    def forward():
+        for line in process.stdout:
+            print(line, end='')
+    threading.Thread(target=forward, daemon=True).start()
+    return '127.0.0.1:{}'.format(found.group(1))
+
+def connect(address, timeout=30):
+    '''Connects to host:port, retrying until worker is started or timeout seconds are passed'''
+    host, port = address.rsplit(':', 1)
+    start = time.time()
+    while True:
+        try:
+            return socket.create_connection((host, int(port)))
+        except OSError:
+            if time.time() - start > timeout:
+                raise
+            time.sleep(0.2)
+
+def island_evolution(params, hosts=(), n_islands=4, topology='ring', interval=2, n_migrants=2):
+    '''Island model genetic algorithm. n_islands populations with CLI parameters params evolve
+    independently in island workers (see serve_islands()) on hosts list of "host:port" addresses
+    (islands are distributed round robin), or in n_islands local worker processes if hosts are empty.
+    Every interval generations n_migrants best samples of every island are sent to islands, selected by
+    migration topology (see migration_sources()). Island i uses seed+i random seed if params seed is defined.
+    The best circuit of all islands is written to params results directory. Returns its result dictionary
+    with per-island statistics list'''
+    processes = []
+    rng = np.random.default_rng(params.get('seed'))
+    files = {}
+    islands = []
+    messages = {}
+    try:
+        if not hosts:
+            for k in range(n_islands):
+                command = [sys.executable, '-u', os.path.abspath(__file__), '--island-worker', '--port', '0',
+                           '--sim', params['sim'], '--jobs', str(params['jobs']), '--eval', params['eval'],
+                           '--cache', params['cache'], '--library', params['library']]
+                command += ['--timeout', str(params['timeout'])] if params['timeout'] else []
+                processes.append(subprocess.Popen(command, stdout=subprocess.PIPE, text=True))
+            hosts = [island_worker_address(process) for process in processes]
+        for k in range(n_islands):
+            address = hosts[k % len(hosts)]
+            files[k] = connect(address).makefile('rw', encoding='utf-8', newline='\n')
+            seed = params['seed'] + k if params.get('seed') is not None else None
+            send_message(files[k], {'type': 'run', 'island': k, 'params': dict(params, seed=seed),
+                                    'interval': interval, 'migrants': n_migrants})
+            islands.append({'island': k, 'host': address, 'migrations': []})
+        active = dict(files)
+        while active:
+            migrants = {}
+            for k in list(active.keys()):
+                message = receive_message(active[k]) or {'type': 'error', 'error': 'connection is closed'}
+                if message['type'] == 'migrants':
+                    migrants[k] = message
+                    islands[k]['migrations'].append((message['generation'], min(message['fitness'])))
+                else:
+                    messages[k] = message
+                    del active[k]
+            sources = migration_sources(topology, n_islands, rng)
+            for k, message in migrants.items():
+                pool = [(fitness, values) for j in sources[k] if migrants.get(j, {}).get('names') == message['names']
+                        for fitness, values in zip(migrants[j]['fitness'], migrants[j]['values'])]
+                pool = sorted(pool, key=lambda x: x[0])[:n_migrants]
+                send_message(active[k], {'type': 'immigrants', 'values': [x[1] for x in pool]})
+    finally:
+        for file in files.values():
+            file.close()
+        for process in processes:
+            process.terminate()
+            process.wait()
+    print('{:<8}{:<24}{:>12}{:>13}{:>13}{:>12}{:>10}'.format('Island', 'Host', 'Fitness', 'Generations',
+                                                            'Simulations', 'Immigrants', 'Time'))
+    for island in islands:
+        message = messages[island['island']]
+        history = message.get('history', {})
+        island.update(fitness=message['result']['fitness'] if message['type'] == 'result' else None,
+                      history=history.get('fitness', []), simulations=history.get('simulations', 0),
+                      immigrants=history.get('immigrants', 0), time=history.get('time'),
+                      error=message.get('error'))
+        print('{:<8}{:<24}{:>12.4g}{:>13}{:>13}{:>12}{:>9.1f}s'.format(island['island'], island['host'],
+              island['fitness'] if island['fitness'] is not None else float('nan'), len(island['history']),
+              island['simulations'], island['immigrants'], island['time'] or 0))
+        if island['error']:
+            print('Island {} failed: {}'.format(island['island'], island['error']))
+        else:
+            print('Island {} convergence: {}'.format(island['island'],
+                                                   ' '.join('{:.4g}'.format(x) for x in island['history'])))
+    finished = [x for x in islands if x['fitness'] is not None]
+    if not finished:
+        raise RuntimeError('all {} islands failed'.format(n_islands))
+    best = min(finished, key=lambda x: x['fitness'])
+    message = messages[best['island']]
+    print('Global best: island {}, fitness {:.4g}'.format(best['island'], best['fitness']))
+    os.makedirs(params['results'], exist_ok=True)
+    gen_name = os.path.join(params['results'], 'generated_'+message['result']['chip']+'.asc')
+    file = open(gen_name, 'w', encoding=ASC_ENCODING)
+    file.write(message['circuit'])
+    file.close()
+    print('Generated circuit: {}'.format(gen_name))
+    return dict(message['result'], output=gen_name, island=best['island'], islands=islands)
+
+def design_options(params):
+    '''Converts CLI parameters dictionary to DesignOptions'''
+    return DesignOptions(steady=params['steady'], timeout=params['timeout'], target=params['target'],
+                         early_stopping={'tolerance': params['tolerance'], 'patience': params['patience'],
+                                         'time_budget': params['time_budget'],
+                                         'simulation_budget': params['sim_budget']},
+                         fidelity=(params['fidelity'], params['promote']) if params['fidelity'] < 1 else None,
+                         oversample=params['surrogate'], freeze=params['freeze'],
+                         checkpoint=params['checkpoint'] or None, resume=params['resume'],
+                         scratch=params['scratch'] or None, results_dir=params['results'],
+                         reuse=not params.get('refresh'), rectifier=params['rectifier'],
+                         equivalent=params['equivalent'] or None)
+
+def design_arguments(params):
+    '''Converts CLI parameters dictionary to generate_scheme_by_request arguments
+    (except simulator, cache, index and library)'''
+    return {'request': params['req'], 'n_generations': params['gen'], 'n_samples': params['pop'],
+            'sel': params['sel'], 'seed': params.get('seed'), 'options': design_options(params)}
 
 text1 = 'step down converter input 27V, output 16V 500mA '       
 text2 = 'low noise linear regulator 40V to 7.2V'                
@@ -560,11 +2779,149 @@ text4 = 'linear converter 24v 60Hz AC input, output 14.2V'
 text5 = 'step down converter 36V AC input, output 16V 500mA'  
 text6 = 'synchronous step-down controller 70V input, output 4.2V and 15V'
 
-if __name__ == '__main__':
+def argument_parser():
+    '''Creates command line arguments parser'''
     parser = argparse.ArgumentParser(description='text_info')
-    parser.add_argument('--req', dest='req', type=str, default = text1, help='Request text')
+    parser.add_argument('--req', dest='req', type=str, default=None,
+                        help='Request text, taken from checkpoint with --resume if not defined')
     parser.add_argument('--gen', dest='gen', type=int, default=6, help='Number of generations')
     parser.add_argument('--pop', dest='pop', type=int, default=20, help='Number of samples in population')
     parser.add_argument('--sel', dest='sel', type=float, default=0.2, help='Fraction of samples, selected for breeding')
+    parser.add_argument('--jobs', dest='jobs', type=int, default=1, help='Number of simultaneously running simulations')
+    parser.add_argument('--cache', dest='cache', type=str, default='fitness_cache.sqlite',
+                        help='Simulation results database file, empty string disables it')
+    parser.add_argument('--eval', dest='eval', type=str, default='sample', choices=['sample', 'step'],
+                        help='Simulation per sample or .step sweep over all samples')
+    parser.add_argument('--sim', dest='sim', type=str, default='ltspice', choices=list(SIMULATORS.keys()),
+                        help='Circuit simulator')
+    parser.add_argument('--build-index', dest='build_index', action='store_true',
+                        help='Compile circuit database search index and exit')
+    parser.add_argument('--batch', dest='batch', type=str, default=None, help='.jsonl file with requests')
+    parser.add_argument('--batch-output', dest='batch_output', type=str, default=None,
+                        help='.jsonl file for batch results')
+    parser.add_argument('--concurrency', dest='concurrency', type=int, default=2,
+                        help='Number of simultaneously processed batch requests')
+    parser.add_argument('--fidelity', dest='fidelity', type=float, default=1,
+                        help='Fraction of .tran time for screening simulations, 1 disables screening')
+    parser.add_argument('--promote', dest='promote', type=float, default=0.3,
+                        help='Fraction of screened samples, simulated with full .tran time')
+    parser.add_argument('--surrogate', dest='surrogate', type=int, default=1,
+                        help='Children oversampling factor for surrogate model pre-screening, 1 disables it')
+    parser.add_argument('--steady', dest='steady', action='store_true',
+                        help='Asynchronous steady-state evolution instead of generations')
+    parser.add_argument('--timeout', dest='timeout', type=float, default=None,
+                        help='Maximum simulation time of single sample in seconds')
+    parser.add_argument('--target', dest='target', type=float, default=None,
+                        help='Target fitness for time to target report')
+    parser.add_argument('--checkpoint', dest='checkpoint', type=str, default='',
+                        help='Optimization state file, saved after every generation, disabled if empty')
+    parser.add_argument('--resume', dest='resume', action='store_true', help='Continue optimization from checkpoint')
+    parser.add_argument('--tolerance', dest='tolerance', type=float, default=0,
+                        help='Minimum improvement of the best fitness for early stopping')
+    parser.add_argument('--patience', dest='patience', type=int, default=None,
+                        help='Number of generations without improvement for early stopping')
+    parser.add_argument('--time-budget', dest='time_budget', type=float, default=None,
+                        help='Optimization time limit in seconds')
+    parser.add_argument('--sim-budget', dest='sim_budget', type=int, default=None,
+                        help='Number of simulations limit')
+    parser.add_argument('--freeze', dest='freeze', type=float, default=0,
+                        help='Relative sensitivity below which components are not optimized, 0 disables analysis')
+    parser.add_argument('--profile', dest='profile', type=str, default='',
+                        help='Trace event .json file for timed pipeline phases, empty string disables profiling')
+    parser.add_argument('--scratch', dest='scratch', type=str, default='',
+                        help='Directory for job workspaces, /dev/shm or system temporary directory if empty')
+    parser.add_argument('--results', dest='results', type=str, default='.',
+                        help='Directory for generated circuits')
+    parser.add_argument('--library', dest='library', type=str, default='design_library.sqlite',
+                        help='Optimized designs database file, empty string disables it')
+    parser.add_argument('--refresh', dest='refresh', action='store_true',
+                        help='Optimize request even if the same design is found in design library')
+    parser.add_argument('--rectifier', dest='rectifier', type=str, default='full_wave',
+                        choices=list(RECTIFIERS.keys()), help='Input circuit for AC requests')
+    parser.add_argument('--equivalent', dest='equivalent', type=str, default='', choices=['', 'pwl', 'ripple'],
+                        help='Rectifier equivalent source during optimization, empty string disables it')
+    parser.add_argument('--serve', dest='serve', action='store_true',
+                        help='Run design daemon with warm index, cache and simulator pool')
+    parser.add_argument('--port', dest='port', type=int, default=DAEMON_PORT, help='Design daemon localhost port')
+    parser.add_argument('--daemon-root', dest='daemon_root', type=str, default='',
+                        help='Directory of request results, checkpoint and scratch paths, current directory if empty')
+    parser.add_argument('--no-daemon', dest='no_daemon', action='store_true',
+                        help='Process request in this process even if design daemon is running')
+    parser.add_argument('--seed', dest='seed', type=int, default=None, help='Random generator seed')
+    parser.add_argument('--islands', dest='islands', type=int, default=1,
+                        help='Number of island model populations, 1 disables island model')
+    parser.add_argument('--topology', dest='topology', type=str, default='ring', choices=TOPOLOGIES,
+                        help='Island model migration topology')
+    parser.add_argument('--migration-interval', dest='migration_interval', type=int, default=2,
+                        help='Number of generations between migrations')
+    parser.add_argument('--migrants', dest='migrants', type=int, default=2,
+                        help='Number of the best samples, migrating from island')
+    parser.add_argument('--island-hosts', dest='island_hosts', type=str, nargs='*', default=[],
+                        help='host:port addresses of island workers, local worker processes are started if empty')
+    parser.add_argument('--island-worker', dest='island_worker', action='store_true',
+                        help='Run island model worker on --port')
+    parser.add_argument('--bind', dest='bind', type=str, default='127.0.0.1',
+                        help='Island worker network interface address, 0.0.0.0 accepts remote coordinators')
+    return parser
+
+if __name__ == '__main__':
+    parser = argument_parser()
     args = parser.parse_args()
-    generate_scheme_by_request(args.req, args.gen, args.pop, args.sel)
+    if args.steady and (args.fidelity < 1 or args.surrogate > 1):
+        parser.error('--steady is not compatible with --fidelity and --surrogate')
+    if args.resume and not args.checkpoint:
+        parser.error('--resume requires --checkpoint')
+    if (args.islands > 1 or args.island_hosts) and args.steady:
+        parser.error('island model is not compatible with --steady')
+    if (args.islands > 1 or args.island_hosts) and args.checkpoint:
+        parser.error('island model is not compatible with --checkpoint')
+    if args.req is None and not args.resume:
+        args.req = text1
+    if args.profile:
+        PROFILER.enable()
+    params = vars(args)
+    islands = args.islands > 1 or args.island_hosts
+    in_process = args.no_daemon or args.profile or args.serve or args.build_index or args.batch or \
+                 islands or args.island_worker
+    status = None if in_process else daemon_status(args.port)
+    if args.build_index:
+        index = SchemeIndex()
+        print('Search index {} with {} circuits'.format(index.index_file, len(index.chip_name)))
+    elif args.serve:
+        simulator = make_simulator(args.sim, args.jobs, args.eval)
+        simulator.timeout = args.timeout
+        serve(DesignService(simulator, FitnessCache(args.cache or None), SchemeIndex(),
+                            DesignLibrary(args.library) if args.library else None, args.concurrency,
+                            server_config(params), args.daemon_root or None), args.port)
+    elif args.island_worker:
+        simulator = make_simulator(args.sim, args.jobs, args.eval)
+        simulator.timeout = args.timeout
+        serve_islands(simulator, FitnessCache(args.cache or None), SchemeIndex(),
+                      DesignLibrary(args.library) if args.library else None, args.port, args.bind)
+    elif islands:
+        island_evolution(params, args.island_hosts, max(args.islands, 1), args.topology,
+                         args.migration_interval, args.migrants)
+    elif args.batch:
+        cache = FitnessCache(args.cache or None)
+        simulator = make_simulator(args.sim, args.jobs, args.eval)
+        simulator.timeout = args.timeout
+        output_file = args.batch_output or os.path.splitext(args.batch)[0]+'_results.jsonl'
+        run_batch(args.batch, output_file, args.concurrency, simulator, cache,
+                  library=DesignLibrary(args.library) if args.library else None,
+                  options=design_options(params).replace(resume=False))
+    elif status and status['config'] == server_config(params):
+        print('Design daemon (pid {}) is used'.format(status['pid']))
+        request_daemon(params, args.port)
+    else:
+        if status:
+            print('Design daemon runs with different {}, request is processed in this process'.format(
+                  ', '.join(x for x in SERVER_PARAMETERS if status['config'][x] != server_config(params)[x])))
+        cache = FitnessCache(args.cache or None)
+        simulator = make_simulator(args.sim, args.jobs, args.eval)
+        simulator.timeout = args.timeout
+        generate_scheme_by_request(**design_arguments(params), cache=cache, simulator=simulator,
+                                   library=DesignLibrary(args.library) if args.library else None)
+    if args.profile:
+        PROFILER.summary(args.jobs)
+        PROFILER.write_trace(args.profile)
+        print('Profile trace: {}'.format(args.profile))
@@ -0,0 +1,12 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture
+def root(monkeypatch):
+    '''Runs test in project directory, where circuit database and dataset are found by relative paths'''
+    monkeypatch.chdir(ROOT)
+    return ROOT
@@ -0,0 +1,20 @@
+import json
+import os
+import scheme_generator as sg
+
+REQUEST = 'low noise linear regulator 40V to 7.2V'
+
+def test_failed_line_doesnt_stop_batch(root, tmp_path):
+    batch = tmp_path / 'batch.jsonl'
+    batch.write_text(json.dumps({'text': REQUEST, 'gen': 2, 'pop': 6, 'seed': 1}) + '\n\n' +
+                     json.dumps({'gen': 2, 'pop': 6}) + '\n')
+    output = str(tmp_path / 'results.jsonl')
+    sg.run_batch(str(batch), output, simulator=sg.StandInSimulator(2), index=sg.SchemeIndex(),
+                 options=sg.DesignOptions(scratch=str(tmp_path), results_dir=str(tmp_path / 'results')))
+    results = sorted((json.loads(x) for x in open(output)), key=lambda x: x['line'])
+    assert [x['line'] for x in results] == [1, 2]
+    assert 'error' not in results[0] and results[0]['chip']
+    assert os.path.basename(results[0]['output']).startswith('job1_')
+    assert os.path.isfile(results[0]['output'])
+    assert results[1]['error'].startswith('KeyError') and 'output' not in results[1]
+    assert all(x.startswith('job1_') for x in os.listdir(str(tmp_path / 'results')))
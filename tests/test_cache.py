@@ -0,0 +1,38 @@
+import scheme_generator as sg
+
+CONTEXT = ('model hash', 12.0, (None, None), 'V(OUT)')
+
+def test_hit_and_miss():
+    cache = sg.FitnessCache()
+    key = cache.key(CONTEXT, ['R1', 'C1'], [1e3, 1e-6])
+    assert cache.get(key) is None
+    cache.put(key, [5.0])
+    assert cache.get(key) == [5.0]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_key_is_canonical():
+    key = sg.FitnessCache.key(CONTEXT, ['R1', 'C1'], [1e3, 1e-6])
+    assert key == sg.FitnessCache.key(CONTEXT, ['C1', 'R1'], [1e-6, 1e3])
+    assert key == sg.FitnessCache.key(CONTEXT, ['R1', 'C1'], [1e3*(1+1e-9), 1e-6])
+    assert key != sg.FitnessCache.key(CONTEXT, ['R1', 'C1'], [1.1e3, 1e-6])
+    assert key != sg.FitnessCache.key(CONTEXT[:1] + (24.0,) + CONTEXT[2:], ['R1', 'C1'], [1e3, 1e-6])
+
+def test_lru_eviction():
+    cache = sg.FitnessCache(max_size=2)
+    keys = [cache.key(CONTEXT, ['R1'], [x]) for x in [1, 2, 3]]
+    cache.put(keys[0], [1])
+    cache.put(keys[1], [2])
+    assert cache.get(keys[0]) == [1]  #keys[1] becomes the least recently used
+    cache.put(keys[2], [3])
+    assert list(cache.memory.keys()) == [keys[0], keys[2]]
+    assert cache.get(keys[1]) is None
+
+def test_database_outlives_memory(tmp_path):
+    db_file = str(tmp_path / 'cache.sqlite')
+    cache = sg.FitnessCache(db_file, max_size=1)
+    keys = [cache.key(CONTEXT, ['R1'], [x]) for x in [1, 2]]
+    cache.put(keys[0], [1])
+    cache.put(keys[1], [2])
+    assert not keys[0] in cache.memory
+    assert cache.get(keys[0]) == [1.0]
+    assert sg.FitnessCache(db_file).get(keys[1]) == [2.0]
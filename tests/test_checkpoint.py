@@ -0,0 +1,72 @@
+import os
+import numpy as np
+import pytest
+import scheme_generator as sg
+
+REQUEST = 'low noise linear regulator 40V to 7.2V'
+
+def test_patience():
+    stopping = sg.EarlyStopping(tolerance=0.01, patience=2)
+    for fitness in [1.0, 0.5, 0.499]:
+        stopping.update(fitness, 10)
+        assert stopping.reason() is None
+    stopping.update(0.495, 10)
+    assert 'not improved' in stopping.reason()
+
+def test_simulation_budget_continues_state():
+    stopping = sg.EarlyStopping(simulation_budget=50)
+    stopping.update(1.0, 30)
+    assert stopping.reason() is None
+    state = {'history': stopping.history, 'simulations': stopping.simulations, 'elapsed': stopping.elapsed()}
+    resumed = sg.EarlyStopping(simulation_budget=50, state=state)
+    assert resumed.history == [1.0]
+    resumed.update(0.9, 20)
+    assert 'simulation budget' in resumed.reason()
+
+def test_time_budget():
+    stopping = sg.EarlyStopping(time_budget=10, state={'history': [], 'simulations': 0, 'elapsed': 11})
+    assert 'time budget' in stopping.reason()
+
+class Interrupt(Exception):
+    pass
+
+def run(tmp_path, name, **kwargs):
+    options = sg.DesignOptions(scratch=str(tmp_path), results_dir=str(tmp_path / name), **kwargs)
+    return sg.generate_scheme_by_request(REQUEST, 4, 8, simulator=sg.StandInSimulator(2), cache=sg.FitnessCache(),
+                                         seed=1, options=options)
+
+def interrupt_after(generation):
+    def progress(event):
+        if event.get('generation') == generation:
+            raise Interrupt()
+    return progress
+
+def test_resume_is_deterministic(root, tmp_path):
+    checkpoint = str(tmp_path / 'state.npz')
+    straight = run(tmp_path, 'straight')
+    with pytest.raises(Interrupt):
+        run(tmp_path, 'interrupted', checkpoint=checkpoint, progress=interrupt_after(2))
+    assert os.path.isfile(checkpoint)
+    options = sg.DesignOptions(checkpoint=checkpoint, resume=True, scratch=str(tmp_path),
+                               results_dir=str(tmp_path / 'resumed'))
+    resumed = sg.generate_scheme_by_request(None, 4, 8, simulator=sg.StandInSimulator(2), cache=sg.FitnessCache(),
+                                            options=options)
+    assert resumed['achieved_voltage'] == straight['achieved_voltage']
+    assert resumed['fitness'] == straight['fitness']
+    assert not os.path.exists(checkpoint)
+
+def test_finished_run_removes_checkpoint(root, tmp_path):
+    checkpoint = str(tmp_path / 'state.npz')
+    run(tmp_path, 'finished', checkpoint=checkpoint)
+    assert not os.path.exists(checkpoint)
+
+def test_resume_rejects_other_request(root, tmp_path):
+    checkpoint = str(tmp_path / 'state.npz')
+    with pytest.raises(Interrupt):
+        run(tmp_path, 'interrupted', checkpoint=checkpoint, progress=interrupt_after(1))
+    with pytest.raises(ValueError):
+        sg.generate_scheme_by_request('step down converter input 27V, output 16V 500mA',
+                                      simulator=sg.StandInSimulator(1),
+                                      options=sg.DesignOptions(checkpoint=checkpoint, resume=True,
+                                                               scratch=str(tmp_path)))
+    assert os.path.isfile(checkpoint)
@@ -0,0 +1,47 @@
+import os
+import pytest
+import scheme_generator as sg
+
+REQUEST = 'low noise linear regulator 40V to 7.2V'
+
+def service(root, concurrency=2):
+    return sg.DesignService(sg.StandInSimulator(2), sg.FitnessCache(), sg.SchemeIndex(), concurrency=concurrency,
+                            root=root)
+
+def wait(job):
+    '''Returns the last event of job'''
+    while True:
+        event = job.events.get(timeout=60)
+        if event['event'] in ['result', 'error']:
+            return event
+
+def test_parallel_jobs_keep_their_results(root, tmp_path):
+    daemon = service(str(tmp_path))
+    params = {'req': REQUEST, 'gen': 2, 'pop': 6, 'results': str(tmp_path), 'scratch': str(tmp_path)}
+    jobs = [daemon.submit(params, 'alice'), daemon.submit(params, 'bob')]
+    outputs = [wait(job)['result']['output'] for job in jobs]
+    assert outputs[0] != outputs[1]
+    assert all(os.path.isfile(x) for x in outputs)
+    assert os.path.basename(outputs[0]).startswith('alice_1_')
+
+def test_paths_outside_root_are_rejected(root, tmp_path):
+    daemon = service(str(tmp_path), 0)
+    for key, path in [('checkpoint', '/etc/passwd'), ('results', '../elsewhere'), ('scratch', '/tmp')]:
+        with pytest.raises(ValueError):
+            daemon.submit({'req': REQUEST, key: path}, 'mallory')
+    os.symlink('/etc', str(tmp_path / 'link'))
+    with pytest.raises(ValueError):
+        daemon.submit({'req': REQUEST, 'checkpoint': 'link/passwd'}, 'mallory')
+    job = daemon.submit({'req': REQUEST, 'checkpoint': 'state.npz', 'results': 'out'}, 'alice')
+    assert job.params['checkpoint'] == os.path.join(os.path.realpath(str(tmp_path)), 'state.npz')
+    assert job.params['results'] == os.path.join(os.path.realpath(str(tmp_path)), 'out')
+
+def test_design_options_from_cli_parameters():
+    params = vars(sg.argument_parser().parse_args(['--req', REQUEST, '--steady', '--refresh', '--checkpoint', 'a.npz']))
+    arguments = sg.design_arguments(params)
+    options = arguments['options']
+    assert arguments['request'] == REQUEST and options.steady and not options.reuse
+    assert options.fidelity is None and options.early_stopping['patience'] == params['patience']
+    changed = options.replace(checkpoint=None, job_name='alice_1_')
+    assert (changed.checkpoint, changed.job_name, changed.steady) == (None, 'alice_1_', True)
+    assert (options.checkpoint, options.job_name) == ('a.npz', '')
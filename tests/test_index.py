@@ -0,0 +1,49 @@
+import os
+import numpy as np
+import scheme_generator as sg
+
+HEADER = ';chip_name;description;input_voltage;output_voltage;output_node;model_file;output_number\n'
+ROWS = ["0;A1;low noise linear regulator;12;[5.0];['V(out)'];A1.asc;1\n",
+        "1;B1;step down switching regulator;24;[5.0];['V(out)'];B1.asc;1\n",
+        "2;C2;dual output step down controller;24;[3.3, 5.0];['V(a)', 'V(b)'];C2.asc;2\n"]
+
+def write_database(filename, rows):
+    file = open(filename, 'w')
+    file.write(HEADER + ''.join(rows))
+    file.close()
+
+def test_rebuild_on_database_change(tmp_path):
+    database = str(tmp_path / 'data.csv')
+    write_database(database, ROWS)
+    index = sg.SchemeIndex(database)
+    assert index.index_file == str(tmp_path / 'data_index.npz') and os.path.isfile(index.index_file)
+    assert list(index.chip_name) == ['A1', 'B1', 'C2']
+    mtime = os.path.getmtime(index.index_file)
+    assert list(sg.SchemeIndex(database).chip_name) == ['A1', 'B1', 'C2']
+    assert os.path.getmtime(index.index_file) == mtime
+    write_database(database, ROWS + ["3;D1;boost converter;5;[12.0];['V(out)'];D1.asc;1\n"])
+    assert list(sg.SchemeIndex(database).chip_name) == ['A1', 'B1', 'C2', 'D1']
+
+def test_output_count_filter(tmp_path):
+    database = str(tmp_path / 'data.csv')
+    write_database(database, ROWS)
+    index = sg.SchemeIndex(database)
+    assert [x['chip_name'] for _, x in index.search('step down controller', 24, [5.0], k=5)] == ['B1', 'A1']
+    assert [x['chip_name'] for _, x in index.search('low noise', 12, [3.3, 5.0], k=5)] == ['C2']
+    assert index.search('regulator', 12, [1.0, 2.0, 3.0]) == []
+
+def test_top_k_order(tmp_path):
+    database = str(tmp_path / 'data.csv')
+    write_database(database, ROWS)
+    index = sg.SchemeIndex(database)
+    found = index.search('low noise linear regulator', 12, [5.0], k=2)
+    assert [x['chip_name'] for _, x in found] == ['A1', 'B1']
+    assert found[0][0] > found[1][0]
+    assert len(index.search('low noise linear regulator', 12, [5.0], k=1)) == 1
+
+def test_text_scores(root):
+    index = sg.SchemeIndex()
+    scores = index.text_scores('Ultralow Noise RF Linear Regulator')
+    assert scores.max() <= 100 + 1e-9 and scores.min() >= 0
+    assert 'Linear Regulator' in index.description[int(np.argmax(scores))]
+    assert not index.text_scores('qqqzzz').any()
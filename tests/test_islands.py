@@ -0,0 +1,46 @@
+import os
+import numpy as np
+import pytest
+import scheme_generator as sg
+
+def test_ring():
+    assert sg.migration_sources('ring', 4) == {0: [3], 1: [0], 2: [1], 3: [2]}
+
+def test_full():
+    assert sg.migration_sources('full', 3) == {0: [1, 2], 1: [0, 2], 2: [0, 1]}
+
+def test_star():
+    assert sg.migration_sources('star', 4) == {0: [1, 2, 3], 1: [0], 2: [0], 3: [0]}
+
+def test_random_is_other_island():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        sources = sg.migration_sources('random', 5, rng)
+        assert sorted(sources) == list(range(5))
+        assert all(len(x) == 1 and x[0] != k for k, x in sources.items())
+
+@pytest.mark.parametrize('topology', sg.TOPOLOGIES)
+def test_single_island_has_no_sources(topology):
+    assert sg.migration_sources(topology, 1) == {0: []}
+
+def test_shared_cache_file(tmp_path):
+    db_file = str(tmp_path / 'cache.sqlite')
+    first, second = sg.FitnessCache(db_file), sg.FitnessCache(db_file)
+    assert first.db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    key = first.key(('model',), ['R1'], [1e3])
+    first.put(key, [1.0])
+    assert second.get(key) == [1.0]
+
+def test_local_islands(root, tmp_path):
+    params = vars(sg.argument_parser().parse_args(['--sim', 'standin', '--cache', '', '--library', '', '--gen', '4',
+                                                   '--pop', '8', '--seed', '1', '--results', str(tmp_path),
+                                                   '--req', 'low noise linear regulator 40V to 7.2V']))
+    result = sg.island_evolution(params, n_islands=2, topology='ring', interval=2, n_migrants=2)
+    islands = result['islands']
+    assert [x['island'] for x in islands] == [0, 1]
+    assert all(x['error'] is None and len(x['history']) == 4 for x in islands)
+    assert all([generation for generation, _ in x['migrations']] == [2] for x in islands)
+    assert all(x['immigrants'] == 2 for x in islands)
+    assert result['fitness'] == min(x['fitness'] for x in islands)
+    assert result['island'] == min(islands, key=lambda x: x['fitness'])['island']
+    assert os.path.isfile(result['output'])
@@ -0,0 +1,41 @@
+import sqlite3
+import scheme_generator as sg
+
+REQUEST = 'low noise linear regulator 40V to 7.2V'
+
+def design(fitness, budget):
+    return {'model': 'hash', 'simulator': 'StandInSimulator', 'chip': 'LT1777', 'input_voltage': 40.0,
+            'ac': [None, None], 'targets': [7.2], 'components': {'R1': 1e3}, 'achieved': [7.0], 'fitness': fitness, 'circuit': '',
+            'budget': budget}
+
+def test_exact_requires_budget_or_target():
+    library = sg.DesignLibrary()
+    library.store(design(0.5, 60))
+    context = ('hash', 'StandInSimulator', 40.0, (None, None), [7.2])
+    assert library.exact(*context, 60)['fitness'] == 0.5
+    assert library.exact(*context, 120) is None
+    assert library.exact(*context, 120, target=1.0)['fitness'] == 0.5
+    assert library.exact(*context, 120, target=0.1) is None
+    assert library.exact('hash', 'StandInSimulator', 40.0, (None, None), [5.0], 60) is None
+
+def test_library_of_previous_version(tmp_path):
+    db_file = str(tmp_path / 'library.sqlite')
+    db = sqlite3.connect(db_file)
+    db.execute('CREATE TABLE designs (id INTEGER PRIMARY KEY, {})'.format(', '.join(sg.DesignLibrary.FIELDS[:-1])))
+    db.commit()
+    db.close()
+    library = sg.DesignLibrary(db_file)
+    library.store(design(0.5, 60))
+    assert library.designs('hash', 'StandInSimulator')[0]['budget'] == 60
+
+def test_larger_budget_is_optimized(root, tmp_path):
+    library = sg.DesignLibrary()
+    def run(n_generations, **kwargs):
+        return sg.generate_scheme_by_request(REQUEST, n_generations, 6, simulator=sg.StandInSimulator(2), seed=0,
+                                             library=library,
+                                             options=sg.DesignOptions(scratch=str(tmp_path),
+                                                                      results_dir=str(tmp_path), **kwargs))
+    assert run(2)['library'] is None
+    assert run(2)['library'] == 'exact'
+    assert run(3)['library'] != 'exact'
+    assert run(2, reuse=False)['library'] != 'exact'
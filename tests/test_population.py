@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import scheme_generator as sg
+
+def reference_raw_value(number, raw):
+    '''Scalar nominal raw rounding of the original implementation'''
+    exp_number = '{:e}'.format(number)
+    value = exp_number.split('e')[0]
+    dec = int(exp_number.split('e')[1])
+    return float(raw[np.argmin(abs(raw - float(value)*100))]*10**(dec-2))
+
+@pytest.mark.parametrize('name', sorted(sg.RAW_SERIES.keys()))
+def test_snap_to_raw_parity(name):
+    raw = sg.RAW_SERIES[name]
+    rng = np.random.default_rng(0)
+    values = np.concatenate([10**rng.uniform(-12, 6, 2000), raw*1e-3, raw*10, (raw[:-1]+raw[1:])/2*1e2])
+    expected = np.array([reference_raw_value(x, raw) for x in values])
+    assert np.allclose(sg.snap_to_raw(values, raw), expected, rtol=1e-12)
+    assert all(sg.number_to_raw_value(x, raw) == pytest.approx(y, rel=1e-12) for x, y in zip(values[:50], expected))
+
+def test_snap_population_keeps_shape():
+    codes = np.array([sg.TYPE_CODES['res'], sg.TYPE_CODES['cap']])
+    values = sg.snap_population([[1234.0, 3.3e-7], [99.0, 1e-9]], codes)
+    assert values.shape == (2, 2)
+    assert values[0, 0] == sg.number_to_raw_value(1234.0, sg.RAW_SERIES['res'])
+
+def test_zero_component_population():
+    population = sg.generate_population({}, {}, 5, np.random.default_rng(0))
+    assert population.values.shape == (5, 0)
+    assert len(population) == 5
+    assert population.sample(0) == {}
+    children = sg.mutation(sg.crossover(population.values, population.values), population.codes)
+    assert population.extend(children).values.shape == (10, 0)
+    assert sg.Population([], [], []).values.shape == (0, 0)
+
+def test_zero_component_circuit(root, tmp_path):
+    '''LT1070 demo circuit has no tunable components'''
+    result = sg.generate_scheme_by_request('5A high efficiency switching regulator input 5V, output 12V', 2, 6,
+                                           simulator=sg.StandInSimulator(2), seed=0,
+                                           options=sg.DesignOptions(scratch=str(tmp_path), results_dir=str(tmp_path)))
+    assert result['chip'] == 'LT1070'
+    assert np.isfinite(result['fitness'])
+
+def test_freeze_without_sensitivity():
+    template = {'R1': 1e3, 'C1': 1e-6}
+    assert sg.freeze_components({}, {}, 0.1) == {}
+    assert sg.freeze_components(template, {'R1': 0.0, 'C1': 0.0}, 0.1) == template
+    assert sg.freeze_components(template, {'R1': 1.0, 'C1': 0.05}, 0.1) == {'R1': 1e3}
+
+@pytest.mark.parametrize('options', [{'fidelity': (0.3, 0.3)}, {'oversample': 3}])
+def test_steady_rejects_screening(options):
+    with pytest.raises(ValueError):
+        sg.generate_scheme_by_request('low noise linear regulator 40V to 7.2V', simulator=sg.StandInSimulator(1),
+                                      options=sg.DesignOptions(steady=True, **options))
@@ -0,0 +1,28 @@
+import scheme_generator as sg
+
+def test_round_robin_order():
+    queue = sg.FairQueue()
+    positions = {job: queue.put(job[0], job) for job in ['a1', 'a2', 'a3', 'b1', 'c1', 'b2']}
+    order = [queue.get() for _ in range(len(positions))]
+    assert order == ['a1', 'b1', 'c1', 'a2', 'b2', 'a3']
+    assert positions == {'a1': 1, 'a2': 2, 'a3': 3, 'b1': 2, 'c1': 3, 'b2': 5}
+    assert len(queue) == 0
+
+def test_position_matches_serving_order():
+    queue = sg.FairQueue()
+    for job in ['a1', 'a2', 'b1', 'a3', 'c1', 'c2', 'b2']:
+        queue.put(job[0], job)
+    queue.get()
+    expected = []
+    for client in ['a', 'b', 'c']:
+        expected += [(client, k, queue.position(client, k)) for k in range(len(queue.queues[client]))]
+    order = [queue.get() for _ in range(len(queue))]
+    for client, k, position in expected:
+        assert [x for x in order if x[0] == client][k] == order[position-1]
+
+def test_new_client_is_served_before_waiting_jobs():
+    queue = sg.FairQueue()
+    for job in ['a1', 'a2', 'a3']:
+        queue.put('a', job)
+    assert queue.put('b', 'b1') == 2
+    assert [queue.get() for _ in range(4)] == ['a1', 'b1', 'a2', 'a3']
@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import pytest
+import scheme_generator as sg
+from conftest import ROOT
+
+DATA = os.path.join(ROOT, 'tests', 'data')
+BINARY = os.path.join(DATA, 'transient.raw')  #LTSpice: UTF-16 header, float64 time, float32 traces
+ASCII = os.path.join(DATA, 'transient_ascii.raw')  #ngspice ASCII
+
+def raw_read(filename, **kwargs):
+    '''Reads file with PyLTSpice reader, returns {trace name: values array}'''
+    PyLTSpice = pytest.importorskip('PyLTSpice')
+    RawRead = getattr(PyLTSpice, 'RawRead', None)
+    if RawRead is None:
+        from PyLTSpice.LTSpice_RawRead import LTSpiceRawRead as RawRead
+        kwargs = {}
+    raw = RawRead(filename, **kwargs)
+    return {name.lower(): np.abs(np.array(raw.get_trace(name).get_wave(0))) if name == 'time'
+            else np.array(raw.get_trace(name).get_wave(0)) for name in raw.get_trace_names()}
+
+def test_binary_matches_pyltspice():
+    expected = raw_read(BINARY)
+    result = sg.read_raw(BINARY)
+    assert sorted(result) == sorted(expected) == ['i(r1)', 'time', 'v(out)']
+    for name in expected:
+        assert np.array_equal(result[name], expected[name])
+
+def test_binary_selected_traces_and_tail():
+    full = sg.read_raw(BINARY)
+    result = sg.read_raw(BINARY, ['V(OUT)', 'missing'], tail=3)
+    assert list(result) == ['v(out)']
+    assert np.array_equal(result['v(out)'], full['v(out)'][-3:])
+
+def test_binary_layout():
+    raw = sg.RawFile(BINARY)
+    assert raw.n_points == 25
+    assert [np.dtype(x).itemsize for x in raw.formats] == [8, 4, 4]
+    assert raw.steps() == [(0, 25)]
+    raw.close()
+
+def test_ascii_matches_pyltspice():
+    expected = raw_read(ASCII, dialect='ngspice')
+    result = sg.read_raw(ASCII)
+    assert sorted(result) == sorted(expected) == ['i(v1)', 'time', 'v(out)']
+    for name in expected:
+        assert np.allclose(result[name], expected[name], rtol=1e-15)
+
+def test_ascii_values():
+    result = sg.read_raw(ASCII, ['v(out)', 'time'], tail=2)
+    assert np.allclose(result['time'], [8e-4, 1e-3])
+    assert np.allclose(result['v(out)'], 3.3*(1-np.exp(-result['time']/2e-4)))
+    assert np.array_equal(sg.read_ascii_raw(ASCII)['i(v1)'], sg.read_raw(ASCII)['i(v1)'])
+
+def test_keep_reads_full_traces_of_improving_sample():
+    full = sg.read_raw(BINARY)
+    keep = sg.BestTraces(['I(R1)'], [full['v(out)'][-1]])
+    result = sg.read_raw(BINARY, ['V(out)'], tail=1, sample={'R1': 1.0}, keep=keep)
+    assert list(result) == ['v(out)'] and len(result['v(out)']) == 1
+    assert np.array_equal(keep.get({'R1': 1.0})[0], full['i(r1)'])
+    sg.read_raw(BINARY, ['V(out)'], tail=1, sample={'R1': 2.0}, keep=keep)
+    assert keep.get({'R1': 2.0}) is None
+
+def test_ngspice_trace_names(tmp_path):
+    text = open(ASCII, encoding='utf-8').read()
+    text = text.replace('\tv(out)\tvoltage', '\tout\tvoltage').replace('\ti(v1)\tcurrent', '\tv1#branch\tcurrent')
+    raw = tmp_path / 'ngspice.raw'
+    raw.write_text(text, encoding='utf-8')
+    assert sorted(sg.read_raw(str(raw))) == ['i(v1)', 'time', 'v(out)']
+    assert sorted(sg.read_ascii_raw(str(raw), ['V(OUT)', 'I(V1)'])) == ['i(v1)', 'v(out)']
+    assert sg.spice_trace_name('@R1[i]') == 'i(r1)'
@@ -0,0 +1,39 @@
+import glob
+import os
+import scheme_generator as sg
+from conftest import ROOT
+
+DATASET = sorted(glob.glob(os.path.join(ROOT, 'pcb_dataset', '*.asc')))
+
+def read_bytes(filename):
+    file = open(filename, 'rb')
+    data = file.read()
+    file.close()
+    return data
+
+def test_dataset_round_trip(tmp_path):
+    assert DATASET
+    output = str(tmp_path / 'circuit.asc')
+    for filename in DATASET:
+        sg.Schematic(filename).write(output)
+        assert read_bytes(output) == read_bytes(filename), filename
+
+def test_changed_value_round_trip(tmp_path):
+    filename = os.path.join(ROOT, 'pcb_dataset', '8025.asc')
+    schematic = sg.Schematic(filename)
+    template, _ = sg.get_netlist_components(schematic)
+    name = sorted(template.keys())[0]
+    output = str(tmp_path / 'changed.asc')
+    sg.write_netlist_components(schematic, output, {name: template[name]*2})
+    changed = sg.Schematic(output)
+    assert sg.get_netlist_components(changed)[0][name] == sg.exp_to_number(sg.number_to_exp(template[name]*2))
+    assert changed.nets() == schematic.nets()
+
+def test_copy_is_independent():
+    schematic = sg.Schematic(os.path.join(ROOT, 'pcb_dataset', '8025.asc'))
+    copy = schematic.copy()
+    name = [x for x, symbol in copy.components.items() if symbol.get('Value')][0]
+    value = schematic.components[name].get('Value')
+    copy.components[name].set('Value', value + '0')
+    assert schematic.components[name].get('Value') == value
+    assert copy.text() != schematic.text()
@@ -0,0 +1,142 @@
+import glob
+import os
+import numpy as np
+import pytest
+import scheme_generator as sg
+
+class FakeSimCommander:
+    '''Records SimCommander calls, run() writes netlist as PyLTSpice does: relative to current directory'''
+    calls = []
+
+    def __init__(self, net_file, parallel_sims=4, timeout=None):
+        self.net_file = net_file
+        self.timeout = timeout
+        self.values = {}
+
+    def set_component_value(self, name, value):
+        self.values[name] = value
+
+    def add_instructions(self, *instructions):
+        pass
+
+    def run(self, run_filename=None):
+        file = open(run_filename, 'w')
+        file.write('* netlist\n')
+        file.close()
+        self.calls.append((run_filename, self.timeout, self.values))
+
+    def wait_completion(self):
+        pass
+
+def fake_ltspice(timeout=None):
+    simulator = sg.LTSpiceSimulator.__new__(sg.LTSpiceSimulator)
+    sg.Simulator.__init__(simulator, 1)
+    simulator.SimCommander = FakeSimCommander
+    simulator.evaluation = 'sample'
+    simulator.timeout = timeout
+    return simulator
+
+def test_netlist_is_written_to_workspace(tmp_path, monkeypatch):
+    workspace = tmp_path / 'workspace'
+    workspace.mkdir()
+    monkeypatch.chdir(tmp_path)
+    net_file = str(workspace / 'circuit.net')
+    FakeSimCommander.calls = []
+    file = fake_ltspice(timeout=5).run(net_file, 'circuit_1', {'R1': 100.0})
+    assert file == str(workspace / 'circuit_1')
+    assert os.path.isfile(file + '.net')
+    assert not os.path.exists(tmp_path / 'circuit_1.net')
+    assert FakeSimCommander.calls == [(file + '.net', 5, {'R1': 100.0})]
+
+REQUEST = 'low noise linear regulator 40V to 7.2V'
+
+class FlakySimulator(sg.StandInSimulator):
+    '''Stand-in simulator, which times out for about third of samples'''
+    def failed(self, sample):
+        return sg.unit_hash(*sorted(sample.items())) < 0.3
+
+    def run(self, model, sample, traces, tail=None, keep=None):
+        if self.failed(sample):
+            raise TimeoutError('simulation takes more than 1s')
+        return super().run(model, sample, traces, tail, keep)
+
+def test_failed_samples_are_not_cached_or_selected(root):
+    scheme, _, _, _ = sg.get_best_scheme_match(REQUEST)
+    filename = os.path.join('pcb_dataset', scheme['model_file'])
+    template, types = sg.get_netlist_components(filename)
+    population = sg.generate_population(template, types, 20, np.random.default_rng(0))
+    simulator, cache = FlakySimulator(2), sg.FitnessCache()
+    failed = [simulator.failed(population.sample(i)) for i in range(len(population))]
+    assert any(failed) and not all(failed)
+    selected, best, level, stats = sg.selection(population, filename, ['V(OUT)'], [7.2], 0.5, simulator, cache)
+    assert np.isfinite(level) and np.isfinite(stats['fitness'])
+    assert not simulator.failed(best)
+    assert not any(simulator.failed(selected.sample(i)) for i in range(len(selected)))
+    for i in range(len(population)):
+        key = cache.key(('V(OUT)',), population.names, population.values[i])
+        assert (cache.get(key) is None) == failed[i]
+
+def test_generations_survive_failed_samples(root, tmp_path):
+    for options in [{}, {'fidelity': (0.3, 0.5)}, {'oversample': 3}]:
+        result = sg.generate_scheme_by_request(REQUEST, 3, 10, simulator=FlakySimulator(2), seed=0,
+                                               options=sg.DesignOptions(scratch=str(tmp_path),
+                                                                        results_dir=str(tmp_path), **options))
+        assert np.isfinite(result['fitness'])
+
+def test_all_samples_timed_out(root, tmp_path):
+    simulator = sg.StandInSimulator(2, delay=0.3)
+    simulator.timeout = 0.1
+    with pytest.raises(RuntimeError, match='samples failed'):
+        sg.generate_scheme_by_request(REQUEST, 2, 4, simulator=simulator,
+                                      options=sg.DesignOptions(scratch=str(tmp_path), results_dir=str(tmp_path)))
+
+RC = '''Version 4
+SHEET 1 880 680
+WIRE 96 16 0 16
+WIRE 96 96 96 112
+FLAG 0 96 0
+FLAG 96 176 0
+FLAG 96 16 out
+SYMBOL voltage 0 0 R0
+SYMATTR InstName V1
+SYMATTR Value 3.3
+SYMBOL res 80 0 R0
+SYMATTR InstName R1
+SYMATTR Value 1k
+SYMBOL cap 80 112 R0
+SYMATTR InstName C1
+SYMATTR Value 200µ
+TEXT 0 200 Left 2 !.tran 1m startup
+'''
+
+def test_ngspice_netlist_from_schematic(tmp_path, monkeypatch):
+    asc = tmp_path / 'rc.asc'
+    asc.write_text(RC, encoding=sg.ASC_ENCODING)
+    monkeypatch.setattr(sg, 'ltspice_netlist', lambda filename: pytest.fail('LTSpice is not needed'))
+    simulator = sg.NgspiceSimulator()
+    lines = simulator.netlist_lines(str(asc))
+    assert [x.split() for x in lines[1:]] == [['V1', 'out', '0', '3.3'], ['R1', 'out', 'N004', '1k'],
+                                             ['C1', 'N004', '0', '200u'], ['.tran', '1m', 'startup'],
+                                             ['.save', 'all', '@r1[i]'], ['.end']]
+    assert simulator.netlist_lines(str(asc)) is lines
+    assert open(simulator.netlist(str(asc)), encoding=sg.ASC_ENCODING).readlines() == lines
+
+def test_abstract_simulator():
+    with pytest.raises(TypeError):
+        sg.Simulator()
+
+def test_rectifier_characterization_is_cached(root, tmp_path, monkeypatch):
+    dc_circuit = str(tmp_path / 'dc.asc')
+    sg.write_intital_voltage(sg.Schematic(sorted(glob.glob('pcb_dataset/*.asc'))[0]), dc_circuit, 12)
+    simulator = sg.StandInSimulator()
+    simulated = []
+    simulate = simulator.simulate
+    monkeypatch.setattr(simulator, 'simulate', lambda filename, *args: simulated.append(filename) or
+                        simulate(filename, *args))
+    cache = sg.FitnessCache(str(tmp_path / 'cache.sqlite'))
+    time_values, voltage = sg.rectifier_bus_voltage('full_wave', (310, 50), dc_circuit, 12, simulator, cache)
+    assert len(simulated) == 2  #input current of DC circuit and rectifier
+    cached = sg.rectifier_bus_voltage('full_wave', (310, 50), dc_circuit, 12, simulator,
+                                      sg.FitnessCache(str(tmp_path / 'cache.sqlite')))
+    assert len(simulated) == 2
+    assert np.array_equal(cached[0], time_values) and np.array_equal(cached[1], voltage)